@@ -5,12 +5,13 @@ a = Analysis(
     ['app.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=[('static', 'static')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Neither is used by app.py; leaving them out shrinks the one-file unpack at startup
+    excludes=['tkinter', 'PIL'],
     noarchive=False,
     optimize=0,
 )
@@ -1,27 +1,260 @@
 """
 System Monitor Dashboard - Single File Version
 Requirements: pip install flask psutil flask-cors
-Optional: pip install gputil (for GPU monitoring)
+Optional: pip install nvidia-ml-py or gputil (for GPU monitoring)
+Optional: pip install brotli msgpack (for compressed / binary API responses)
+Optional: pip install numpy (vectorized per-core heatmap tiles)
+
+The dashboard's HTML, CSS and JS live in static/ next to this file.
 
 Run: python app.py
 Then open: http://localhost:5000
+
+Production: python app.py --headless --host 0.0.0.0 --server waitress
+            (or --server gunicorn/uvicorn --workers 4; pip install the server)
 """
 
-from flask import Flask, jsonify
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 import psutil
 import platform
 import socket
+import os
+import mmap
+import struct
+import json
+import hashlib
+import random
+import asyncio
+import argparse
+import atexit
+import gzip
+import importlib
+import math
+import zlib
+import sys
+import queue
+import heapq
+import fnmatch
+import operator
+import re
+import traceback
+import mimetypes
+from collections import Counter, deque
+from contextlib import contextmanager
+from itertools import chain
+from concurrent.futures import Future, wait
+from types import MappingProxyType
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 
-app = Flask(__name__)
-CORS(app)
+# Start of the startup trace's 'imports done' phase (see StartupTrace)
+IMPORTED_AT = time.time()
 
-# Store historical data for graphs
-cpu_history = []
-ram_history = []
+# The dashboard's own StaticAssets serve /static (hashed names, precompressed)
+app = Flask(__name__, static_folder=None)
+# Other origins may read the API, but not change state: POST and DELETE get no
+# preflight approval, and the POST endpoints only take JSON (which needs one)
+CORS(app, methods=['GET', 'HEAD'])
+
+# Number of points returned in the /api/stats 'history' field
 MAX_HISTORY = 60
 
+# Samples kept per metric in the in-memory time-series store (10 min at 1s)
+HISTORY_CAPACITY = 600
+# Upper bound on distinct series so memory stays fixed on very large hosts
+MAX_SERIES = 4096
+
+# Downsampled history tiers as (bucket seconds, buckets kept):
+# 10s for 6 hours, 1m for 7 days, 1h for a year
+ROLLUP_TIERS = [(10, 6 * 360), (60, 7 * 1440), (3600, 365 * 24)]
+# Rollup columns start this small and double as buckets open, so a series
+# only costs what it has kept (36 bytes a bucket, ~750KB once all tiers are full)
+ROLLUP_INITIAL_BUCKETS = 64
+# Series that get rollup tiers; later ones keep only their raw ring
+ROLLUP_MAX_SERIES = 512
+# Points /api/history aims for when no step is requested
+HISTORY_MAX_POINTS = 500
+# magic, version, columns, rows, reserved, step (padded to 24 bytes for Float64Array)
+HISTORY_BINARY_HEADER = struct.Struct('<4sHHIId')
+HISTORY_BINARY_MAGIC = b'SMTS'
+HISTORY_FORMATS = {
+    'json': 'application/json',
+    'msgpack': 'application/x-msgpack',
+    'binary': 'application/octet-stream',
+}
+
+# Per-core CPU and per-sensor temperature heatmaps (numpy is used when
+# installed: pip install numpy): rows kept (1 hour at 1s), columns stored,
+# and the most tile rows and column groups /api/heatmap returns
+HEATMAP_CAPACITY = 3600
+HEATMAP_MAX_COLUMNS = 1024
+HEATMAP_MAX_ROWS = 300
+HEATMAP_MAX_COLS = 256
+# magic, version, reserved, rows, cols, step (24 bytes, like HISTORY_BINARY_HEADER)
+HEATMAP_BINARY_HEADER = struct.Struct('<4sHHIId')
+HEATMAP_BINARY_MAGIC = b'SMHM'
+HEATMAP_FORMATS = {
+    'json': 'application/json',
+    'binary': 'application/octet-stream',
+}
+
+# Serving: HTTP servers selectable with --server, and the shared-memory
+# block the sampler process uses to hand snapshots to worker processes
+SERVERS = ['flask', 'waitress', 'gunicorn', 'uvicorn']
+SHARED_SNAPSHOT_ENV = 'SYSMON_SHARED_SNAPSHOT'
+SHARED_SNAPSHOT_SIZE = 8 * 1024 * 1024
+SHARED_SNAPSHOT_POLL = 0.25
+
+# Prometheus / OpenMetrics exporter
+METRICS_PREFIX = 'sysmon_'
+OPENMETRICS_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PROMETHEUS_TEXT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Response compression (brotli is used when installed: pip install brotli)
+COMPRESS_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Dashboard assets (index.html, CSS, JS) ship in static/ next to app.py, or
+# inside the PyInstaller bundle (sys._MEIPASS)
+STATIC_DIR = os.path.join(getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__))), 'static')
+STATIC_MAX_AGE = 365 * 24 * 3600  # hashed names never change content
+STATIC_HASH_LENGTH = 12
+# Assets are compressed once, so spend the CPU on the best ratio
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+
+# On-disk metric log: set SYSMON_DATA_DIR to an empty string to disable it
+DATA_DIR = os.environ.get('SYSMON_DATA_DIR', os.path.join(os.path.expanduser('~'), '.system_monitor'))
+SEGMENT_SECONDS = 3600  # one segment file per hour
+SEGMENT_MIN_RECORDS = 4096
+HISTORY_RETENTION = 7 * 24 * 3600  # whole segments older than this are deleted
+# The log keeps step-second averages (the finest rollup tier), not raw samples:
+# raw history lives only in memory, so about 0.3MB an hour for 35 series
+HISTORY_LOG_STEP = 10
+# Series persisted at most; later ones are kept in memory only
+HISTORY_LOG_MAX_SERIES = 256
+SEGMENT_MAGIC = b'SYSMSEG1'
+SEGMENT_VERSION = 1
+# magic, version, capacity, first timestamp, last timestamp, record count
+SEGMENT_HEADER = struct.Struct('<8sIIddQ')
+SEGMENT_HEADER_SIZE = 64
+
+# Alert rules: one per line in SYSMON_ALERT_RULES (see AlertRule), or the
+# defaults below. Firings are appended to alerts.jsonl in DATA_DIR and, if
+# SYSMON_ALERT_WEBHOOK is set, POSTed there as JSON.
+ALERT_RULES_FILE = os.environ.get('SYSMON_ALERT_RULES', '')
+ALERT_WEBHOOK = os.environ.get('SYSMON_ALERT_WEBHOOK', '')
+ALERT_WEBHOOK_TIMEOUT = 5
+DEFAULT_ALERT_RULES = [
+    'cpu-high: cpu.usage > 90 for 2m',
+    'memory-high: memory.percent > 90 for 2m',
+]
+# Without an explicit 'clear' value a rule resolves this fraction of its
+# threshold back on the safe side (90 -> 85.5), so it does not flap
+ALERT_HYSTERESIS = 0.05
+ALERT_EVENTS_KEPT = 200
+
+# Multi-host: agents (--agent URL) POST batches of samples to a collector
+# (--collector) at /api/ingest. Set SYSMON_INGEST_TOKEN on both sides to
+# require a shared bearer token.
+AGENT_BATCH_SECONDS = 5
+AGENT_MAX_ROWS = 3600  # rows buffered while the collector is unreachable
+AGENT_TIMEOUT = 10
+INGEST_TOKEN = os.environ.get('SYSMON_INGEST_TOKEN', '')
+INGEST_MAX_BYTES = 16 * 1024 * 1024
+INGEST_MAGIC = b'SMIB'
+# magic, version, reserved, rows, metadata length
+INGEST_HEADER = struct.Struct('<4sHHII')
+# Per-host history on the collector, smaller than the local store so
+# hundreds of hosts fit in memory (~9 KB per series): 2 minutes raw and
+# 4 hours of 1 minute rollups
+FLEET_HISTORY_CAPACITY = 120
+FLEET_ROLLUP_TIERS = [(60, 4 * 60)]
+FLEET_MAX_SERIES = 1024
+FLEET_OFFLINE_AFTER = 30
+FLEET_TOP_MAX = 100
+# Hosts a collector tracks at most; batches from further hosts get 403
+FLEET_MAX_HOSTS = 1024
+
+# Seconds between background samples
+SAMPLE_INTERVAL = 1.0
+
+# GPU backend: 'nvml', 'gputil', 'fake' or 'none' (auto-detected when unset)
+GPU_BACKEND = os.environ.get('SYSMON_GPU_BACKEND', '')
+
+# Seconds between cheap checks for changes to the cached /api/system data
+SYSTEM_INFO_CHECK_INTERVAL = 30
+
+# Disk collector: partition table refresh, per-mount probe timeout and backoff
+DISK_PARTITION_REFRESH = 60
+DISK_PROBE_TIMEOUT = 2.0
+DISK_PROBE_WORKERS = 4
+# Threads the probe pool may grow to while probes are stuck on hung mounts
+DISK_PROBE_MAX_WORKERS = 32
+DISK_STALE_BACKOFF_MAX = 300
+
+# Collectors: default per-collector timeout and pool size for blocking ones
+COLLECTOR_TIMEOUT = 2.0
+COLLECTOR_WORKERS = 8
+# Each collector's interval is stretched by up to this fraction either way
+# so collectors with the same interval drift apart instead of firing together
+COLLECTOR_JITTER = 0.1
+# With no API requests or stream clients for CLIENT_IDLE_AFTER seconds,
+# every collector interval is multiplied by IDLE_SLOWDOWN
+CLIENT_IDLE_AFTER = 30
+IDLE_SLOWDOWN = 5
+
+# Self-instrumentation: latency histogram bucket bounds in seconds
+PERF_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Sampling profiler: seconds between stack samples, frames kept per stack,
+# distinct stacks kept, and how long it may run before stopping itself
+PROFILE_INTERVAL = 0.01
+PROFILE_DEPTH = 32
+PROFILE_MAX_STACKS = 5000
+PROFILE_MAX_SECONDS = 300
+
+# Process table: stop sampling when /api/processes is idle this long (seconds)
+PROCESS_IDLE_AFTER = 60
+PROCESS_LIMIT_MAX = 500
+# /api/processes sort name -> column in ProcessCollector rows
+PROCESS_SORT_KEYS = {'cpu': 0, 'memory': 1, 'pid': 2, 'threads': 5}
+# cgroup (container) metrics on Linux, read from SYSMON_CGROUP_ROOT (point
+# it at a fake cgroupfs tree to test). SYSMON_CGROUP_MODE decides whether
+# cpu and memory are reported against this process's cgroup limits instead
+# of the whole host: 'auto' (when the cgroup has a limit), 'on' or 'off'.
+CGROUP_ROOT = os.environ.get('SYSMON_CGROUP_ROOT', '/sys/fs/cgroup')
+CGROUP_MODE = os.environ.get('SYSMON_CGROUP_MODE', 'auto')
+CGROUP_READ_SIZE = 4096  # first pread size; doubled for files that outgrow it
+# v1 reports "no limit" as a huge page-rounded number rather than 'max'
+CGROUP_UNLIMITED = 2 ** 62
+# /api/cgroups: tree rescan interval, walk depth and size, idle cut-off
+CGROUP_SCAN_INTERVAL = 30
+CGROUP_MAX_DEPTH = 4
+CGROUP_MAX_GROUPS = 512
+CGROUP_IDLE_AFTER = 60
+CGROUP_LIMIT_MAX = 500
+# /api/cgroups sort name -> field of a cgroup sample
+CGROUP_SORT_KEYS = {'cpu': 'cpu_cores', 'memory': 'memory_current', 'throttled': 'throttled_percent',
+                    'cpu_pressure': 'cpu_pressure', 'memory_pressure': 'memory_pressure',
+                    'io_pressure': 'io_pressure'}
+# Seconds between SSE keep-alive comments when no new snapshot arrives
+STREAM_KEEPALIVE = 15
+# Streams end after this long and EventSource reconnects, so a server that
+# cannot detect a dropped client (e.g. uvicorn's WSGI bridge) never leaks it
+STREAM_MAX_AGE = 300
+# Each stream holds a server thread, so streams are capped this many below
+# the server's thread count (--threads) and further clients get a 503 and poll
+DEFAULT_THREADS = 32
+STREAM_SPARE_THREADS = 4
+# uvicorn's WSGI bridge runs a fixed pool of this many threads per worker
+UVICORN_WSGI_THREADS = 10
+STREAM_MAX_CLIENTS_ENV = 'SYSMON_MAX_STREAMS'
+
 def get_size(bytes):
     """Convert bytes to human readable format"""
     for unit in ['', 'K', 'M', 'G', 'T', 'P']:
@@ -29,6 +262,141 @@ def get_size(bytes):
             return f"{bytes:.2f}{unit}B"
         bytes /= 1024
 
+class NullGpuBackend:
+    """Backend used when no GPU or GPU library is available"""
+    name = 'none'
+
+    def read(self):
+        return []
+
+    def device_count(self):
+        return 0
+
+class NvmlGpuBackend:
+    """Reads every NVIDIA GPU through one long-lived NVML session (pip install nvidia-ml-py)"""
+    name = 'nvml'
+
+    def __init__(self):
+        import pynvml
+        pynvml.nvmlInit()
+        self._nvml = pynvml
+        count = pynvml.nvmlDeviceGetCount()
+        if not count:
+            pynvml.nvmlShutdown()
+            raise RuntimeError('NVML found no GPUs')
+        self._handles = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(count)]
+        self._names = [self._text(pynvml.nvmlDeviceGetName(handle)) for handle in self._handles]
+        self._driver = self._text(pynvml.nvmlSystemGetDriverVersion())
+
+    @staticmethod
+    def _text(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    def device_count(self):
+        return self._nvml.nvmlDeviceGetCount()
+
+    def read(self):
+        nvml = self._nvml
+        gpus = []
+        for index, handle in enumerate(self._handles):
+            memory = nvml.nvmlDeviceGetMemoryInfo(handle)
+            gpus.append({
+                'id': index,
+                'name': self._names[index],
+                'load': float(nvml.nvmlDeviceGetUtilizationRates(handle).gpu),
+                'temp': float(nvml.nvmlDeviceGetTemperature(handle, nvml.NVML_TEMPERATURE_GPU)),
+                'memory_used': memory.used / 1024 ** 2,
+                'memory_total': memory.total / 1024 ** 2,
+                'driver': self._driver
+            })
+        return gpus
+
+class GPUtilGpuBackend:
+    """Reads GPUs through GPUtil (one nvidia-smi call covers every device)"""
+    name = 'gputil'
+
+    def __init__(self):
+        import GPUtil
+        self._gputil = GPUtil
+        if not GPUtil.getGPUs():
+            raise RuntimeError('GPUtil found no GPUs')
+
+    def device_count(self):
+        return len(self._gputil.getGPUs())
+
+    def read(self):
+        return [{
+            'id': gpu.id,
+            'name': gpu.name,
+            'load': gpu.load * 100,
+            'temp': gpu.temperature,
+            'memory_used': gpu.memoryUsed,
+            'memory_total': gpu.memoryTotal,
+            'driver': getattr(gpu, 'driver', 'Unknown')
+        } for gpu in self._gputil.getGPUs()]
+
+class FakeGpuBackend:
+    """Deterministic synthetic GPUs for testing on machines without one"""
+    name = 'fake'
+
+    def __init__(self, count=None):
+        self.count = int(os.environ.get('SYSMON_FAKE_GPUS', 1)) if count is None else count
+        self.reads = 0
+
+    def device_count(self):
+        return self.count
+
+    def read(self):
+        self.reads += 1
+        gpus = []
+        for index in range(self.count):
+            phase = (self.reads + index * 7) % 20
+            gpus.append({
+                'id': index,
+                'name': f"Fake GPU {index}",
+                'load': phase * 5.0,
+                'temp': 40.0 + phase,
+                'memory_used': 1024.0 + phase * 100,
+                'memory_total': 8192.0,
+                'driver': 'fake'
+            })
+        return gpus
+
+GPU_BACKENDS = {
+    'nvml': NvmlGpuBackend,
+    'gputil': GPUtilGpuBackend,
+    'fake': FakeGpuBackend,
+    'none': NullGpuBackend,
+}
+
+_gpu_backend = None
+_gpu_backend_lock = threading.Lock()
+
+def detect_gpu_backend(preferred=None):
+    """Pick the first working GPU backend: NVML, then GPUtil, then none"""
+    names = [preferred] if preferred else ['nvml', 'gputil']
+    for name in names:
+        try:
+            return GPU_BACKENDS[name]()
+        except Exception:
+            continue
+    return NullGpuBackend()
+
+def get_gpu_backend():
+    """Return the GPU backend, detecting it once (a missing GPU is cached too)"""
+    global _gpu_backend
+    if _gpu_backend is None:
+        with _gpu_backend_lock:
+            if _gpu_backend is None:
+                _gpu_backend = detect_gpu_backend(GPU_BACKEND)
+    return _gpu_backend
+
+def reset_gpu_backend():
+    """Forget the detected GPU backend so the next use detects it again"""
+    global _gpu_backend
+    with _gpu_backend_lock:
+        _gpu_backend = None
+
 def get_system_info():
     """Get static system information"""
     try:
@@ -50,16 +418,12 @@ def get_system_info():
         
         # Get GPU info
         try:
-            import GPUtil
-            gpus = GPUtil.getGPUs()
-            info['gpu_list'] = []
-            for gpu in gpus:
-                info['gpu_list'].append({
-                    'name': gpu.name,
-                    'memory': f"{gpu.memoryTotal:.0f}MB",
-                    'driver': getattr(gpu, 'driver', 'Unknown')
-                })
-        except:
+            info['gpu_list'] = [{
+                'name': gpu['name'],
+                'memory': f"{gpu['memory_total']:.0f}MB",
+                'driver': gpu['driver']
+            } for gpu in get_gpu_backend().read()]
+        except Exception:
             info['gpu_list'] = []
         
         # Get display info (Windows)
@@ -84,17 +448,72 @@ def get_system_info():
     except Exception as e:
         return {'error': str(e)}
 
+class SystemInfoCache:
+    """Memoized /api/system record with a precomputed JSON body and ETag
+
+    The record is rebuilt only when a cheap fingerprint (boot time, CPU
+    counts, GPU count) changes, checked at most every check_interval seconds.
+    """
+
+    def __init__(self, check_interval=SYSTEM_INFO_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._checked = 0
+        self.record = None
+        self.body = None
+        self.etag = None
+
+    def _current_fingerprint(self):
+        try:
+            backend = get_gpu_backend()
+            if isinstance(backend, NullGpuBackend):
+                # Nothing was found last time and the null backend always
+                # counts 0: detect again so a hotplugged GPU shows up
+                reset_gpu_backend()
+                backend = get_gpu_backend()
+            gpus = backend.device_count()
+        except Exception:
+            gpus = 0
+        return (psutil.boot_time(), psutil.cpu_count(logical=False), psutil.cpu_count(logical=True), gpus)
+
+    def get(self):
+        """Return (body, etag), rebuilding the record only if something changed"""
+        now = time.monotonic()
+        if self.body is not None and now - self._checked < self.check_interval:
+            return self.body, self.etag
+        with self._lock:
+            if self.body is not None and now - self._checked < self.check_interval:
+                return self.body, self.etag
+            fingerprint = self._current_fingerprint()
+            if self.body is None or fingerprint != self._fingerprint:
+                if self._fingerprint is not None and fingerprint[3] != self._fingerprint[3]:
+                    # GPUs were added or removed: detect the backend again
+                    reset_gpu_backend()
+                info = get_system_info()
+                body = json.dumps(info).encode()
+                self.record = MappingProxyType(info)
+                self.etag = hashlib.sha1(body).hexdigest()
+                self.body = body
+                self._fingerprint = fingerprint
+            # Errors are not memoized; try again on the next request
+            self._checked = 0 if 'error' in self.record else now
+            return self.body, self.etag
+
+system_info_cache = SystemInfoCache()
+
 def get_cpu_info():
     """Get CPU usage information"""
     try:
-        cpu_percent = psutil.cpu_percent(interval=1, percpu=False)
+        # Non-blocking: usage since the previous call (the sampler primes it)
+        cpu_percent = psutil.cpu_percent(interval=None, percpu=False)
         cpu_freq = psutil.cpu_freq()
         
         info = {
             'usage': cpu_percent,
             'freq_current': cpu_freq.current if cpu_freq else 0,
             'freq_max': cpu_freq.max if cpu_freq else 0,
-            'per_core': psutil.cpu_percent(interval=1, percpu=True)
+            'per_core': psutil.cpu_percent(interval=None, percpu=True)
         }
         return info
     except Exception as e:
@@ -107,69 +526,295 @@ def get_memory_info():
         swap = psutil.swap_memory()
         
         info = {
-            'total': get_size(mem.total),
-            'available': get_size(mem.available),
-            'used': get_size(mem.used),
+            'total': mem.total,
+            'available': mem.available,
+            'used': mem.used,
             'percent': mem.percent,
-            'swap_total': get_size(swap.total),
-            'swap_used': get_size(swap.used),
+            'swap_total': swap.total,
+            'swap_used': swap.used,
             'swap_percent': swap.percent
         }
         return info
     except Exception as e:
         return {'error': str(e)}
 
+class DaemonPool:
+    """Small bounded pool of daemon threads
+
+    Unlike ThreadPoolExecutor its workers never block interpreter exit, so a
+    call stuck on a hung mount cannot keep the app from shutting down.
+    Threads start on demand. While more work is queued than there are idle
+    workers the pool grows past `workers` up to `max_workers`, so calls that
+    never return cannot starve the rest; the extra threads exit once idle.
+    """
+
+    def __init__(self, workers, name, max_workers=None):
+        self.workers = workers
+        self.max_workers = max(max_workers or workers, workers)
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = 0
+        self._idle = 0
+        self._spawned = 0
+
+    def submit(self, fn, *args):
+        """Queue fn(*args) and return a concurrent.futures.Future for it"""
+        future = Future()
+        with self._lock:
+            self._queue.put((future, fn, args))
+            if self._queue.qsize() > self._idle and self._threads < self.max_workers:
+                self._threads += 1
+                self._idle += 1
+                self._spawned += 1
+                threading.Thread(target=self._work, name=f"{self.name}-{self._spawned}", daemon=True).start()
+        return future
+
+    def after_fork(self):
+        """In a forked child none of the parent's threads exist: start over empty"""
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = self._idle = 0
+
+    def _work(self):
+        while True:
+            future, fn, args = self._queue.get()
+            with self._lock:
+                self._idle -= 1
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+            with self._lock:
+                if self._threads > self.workers and self._queue.qsize() <= self._idle:
+                    self._threads -= 1
+                    return
+                self._idle += 1
+
+class DiskCollector:
+    """Disk usage and I/O rates without letting one bad mount stall a sample
+
+    The partition table is cached and refreshed every partition_refresh
+    seconds. Usage probes run concurrently on a pool of `workers` threads and
+    each is waited on for at most probe_timeout. A mount that does not answer in
+    time keeps its last known usage, is flagged stale and is not probed
+    again until its exponential backoff expires and the hung call returns.
+    Threads stuck on such mounts are replaced (up to max_workers) so the
+    healthy mounts keep being probed.
+    """
+
+    def __init__(self, partition_refresh=DISK_PARTITION_REFRESH, probe_timeout=DISK_PROBE_TIMEOUT,
+                 workers=DISK_PROBE_WORKERS, max_backoff=DISK_STALE_BACKOFF_MAX,
+                 max_workers=DISK_PROBE_MAX_WORKERS):
+        self.partition_refresh = partition_refresh
+        self.probe_timeout = probe_timeout
+        self.max_backoff = max_backoff
+        self._pool = DaemonPool(workers, 'disk-probe', max_workers)
+        self._partitions = []
+        self._partitions_at = None
+        self._mounts = {}
+        self._io_previous = None
+        self._io_time = None
+
+    def _mount_state(self, mountpoint):
+        state = self._mounts.get(mountpoint)
+        if state is None:
+            state = self._mounts[mountpoint] = {
+                'usage': None, 'future': None, 'stale': False, 'backoff': 0, 'retry_at': 0
+            }
+        return state
+
+    def partitions(self):
+        """Return the cached partition list, refreshing it when due"""
+        now = time.monotonic()
+        if self._partitions_at is None or now - self._partitions_at >= self.partition_refresh:
+            self._partitions = psutil.disk_partitions()
+            self._partitions_at = now
+            mounted = {partition.mountpoint for partition in self._partitions}
+            for mountpoint in list(self._mounts):
+                if mountpoint not in mounted and self._mounts[mountpoint]['future'] is None:
+                    del self._mounts[mountpoint]
+        return self._partitions
+
+    def _finish(self, state, future, now):
+        state['future'] = None
+        try:
+            state['usage'] = future.result()
+            state['stale'] = False
+            state['backoff'] = 0
+        except Exception:
+            # Permission errors, unmounted or unreachable media: retry later
+            state['usage'] = None
+            self._back_off(state, now)
+
+    def _back_off(self, state, now):
+        state['backoff'] = min(max(state['backoff'] * 2, self.probe_timeout), self.max_backoff)
+        state['retry_at'] = now + state['backoff']
+
+    def usage(self):
+        """Return [(partition, usage, stale)] for every mount with known usage"""
+        partitions = self.partitions()
+        now = time.monotonic()
+        pending = {}
+        for partition in partitions:
+            state = self._mount_state(partition.mountpoint)
+            future = state['future']
+            if future is not None:
+                if future.done():
+                    self._finish(state, future, now)
+                else:
+                    continue  # still hung from an earlier sample
+            if now >= state['retry_at']:
+                state['future'] = self._pool.submit(psutil.disk_usage, partition.mountpoint)
+                pending[state['future']] = state
+        
+        if pending:
+            wait(pending, timeout=self.probe_timeout)
+        now = time.monotonic()
+        for future, state in pending.items():
+            if future.done():
+                self._finish(state, future, now)
+            else:
+                state['stale'] = True
+                self._back_off(state, now)
+        
+        result = []
+        for partition in partitions:
+            state = self._mounts.get(partition.mountpoint)
+            if state is not None and state['usage'] is not None:
+                result.append((partition, state['usage'], state['stale']))
+        return result
+
+    def io_rates(self):
+        """Return per-disk read/write bytes per second and IOPS since the last call"""
+        counters = psutil.disk_io_counters(perdisk=True) or {}
+        now = time.monotonic()
+        previous, elapsed = self._io_previous, now - self._io_time if self._io_time else 0
+        self._io_previous, self._io_time = counters, now
+        if not previous or elapsed <= 0:
+            return {}
+        
+        def rate(new, old):
+            # Counters reset (e.g. device re-attached) count as zero activity
+            return max(new - old, 0) / elapsed
+        
+        rates = {}
+        for disk, current in counters.items():
+            old = previous.get(disk)
+            if old is None:
+                continue
+            rates[disk] = {
+                'read_bytes_per_sec': rate(current.read_bytes, old.read_bytes),
+                'write_bytes_per_sec': rate(current.write_bytes, old.write_bytes),
+                'read_iops': rate(current.read_count, old.read_count),
+                'write_iops': rate(current.write_count, old.write_count)
+            }
+        return rates
+
+disk_collector = DiskCollector()
+
 def get_disk_info():
     """Get disk usage information"""
     try:
         partitions = []
-        for partition in psutil.disk_partitions():
-            try:
-                usage = psutil.disk_usage(partition.mountpoint)
-                partitions.append({
-                    'device': partition.device,
-                    'mountpoint': partition.mountpoint,
-                    'fstype': partition.fstype,
-                    'total': get_size(usage.total),
-                    'used': get_size(usage.used),
-                    'free': get_size(usage.free),
-                    'percent': usage.percent
-                })
-            except PermissionError:
-                continue
+        for partition, usage, stale in disk_collector.usage():
+            partitions.append({
+                'device': partition.device,
+                'mountpoint': partition.mountpoint,
+                'fstype': partition.fstype,
+                'total': usage.total,
+                'used': usage.used,
+                'free': usage.free,
+                'percent': usage.percent,
+                'stale': stale
+            })
         return partitions
     except Exception as e:
         return {'error': str(e)}
 
+def get_disk_io_info():
+    """Get disk I/O throughput per disk"""
+    try:
+        return disk_collector.io_rates()
+    except Exception as e:
+        return {'error': str(e)}
+
+NETWORK_COUNTERS = ['bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv',
+                    'errin', 'errout', 'dropin', 'dropout']
+
+class NetworkCollector:
+    """Per-interface and total network rates from successive net_io_counters readings"""
+
+    def __init__(self):
+        self._previous = {}
+        self._time = None
+
+    @staticmethod
+    def _delta(new, old):
+        # net_io_counters(nowrap=True) already folds real wraps in, so a counter
+        # that went down was reset (interface re-created, driver reload): count
+        # it as zero activity and rate from the new value next time
+        return max(new - old, 0)
+
+    def sample(self):
+        """Return (totals, per-interface rates) since the previous call"""
+        counters = psutil.net_io_counters(pernic=True, nowrap=True)
+        now = time.monotonic()
+        elapsed = now - self._time if self._time is not None else 0
+        previous = self._previous
+        self._previous, self._time = counters, now
+        
+        totals = dict.fromkeys(NETWORK_COUNTERS, 0)
+        for current in counters.values():
+            for field in NETWORK_COUNTERS:
+                totals[field] += getattr(current, field)
+        
+        # Interfaces that just appeared have no rate yet; vanished ones drop out
+        interfaces = {}
+        for nic, current in counters.items():
+            old = previous.get(nic)
+            if old is None or elapsed <= 0:
+                continue
+            interfaces[nic] = {
+                f"{field}_per_sec": self._delta(getattr(current, field), getattr(old, field)) / elapsed
+                for field in NETWORK_COUNTERS
+            }
+        return totals, interfaces
+
+network_collector = NetworkCollector()
+
 def get_network_info():
-    """Get network information"""
+    """Get network totals plus per-interface and aggregate rates"""
     try:
-        net_io = psutil.net_io_counters()
+        totals, interfaces = network_collector.sample()
         info = {
-            'bytes_sent': get_size(net_io.bytes_sent),
-            'bytes_recv': get_size(net_io.bytes_recv),
-            'packets_sent': net_io.packets_sent,
-            'packets_recv': net_io.packets_recv,
+            'bytes_sent': totals['bytes_sent'],
+            'bytes_recv': totals['bytes_recv'],
+            'packets_sent': totals['packets_sent'],
+            'packets_recv': totals['packets_recv'],
         }
+        for field in NETWORK_COUNTERS:
+            key = f"{field}_per_sec"
+            info[key] = sum(rates[key] for rates in interfaces.values())
+        info['interfaces'] = interfaces
         return info
     except Exception as e:
         return {'error': str(e)}
 
 def get_gpu_info():
-    """Get GPU information (requires gputil)"""
+    """Get GPU information (requires nvidia-ml-py or gputil)"""
     try:
-        import GPUtil
-        gpus = GPUtil.getGPUs()
         gpu_list = []
-        for gpu in gpus:
+        for gpu in get_gpu_backend().read():
             gpu_list.append({
-                'id': gpu.id,
-                'name': gpu.name,
-                'load': f"{gpu.load * 100:.1f}",
-                'temp': f"{gpu.temperature:.1f}",
-                'memory_used': f"{gpu.memoryUsed:.0f}",
-                'memory_total': f"{gpu.memoryTotal:.0f}",
-                'memory_percent': f"{(gpu.memoryUsed / gpu.memoryTotal * 100):.1f}"
+                'id': gpu['id'],
+                'name': gpu['name'],
+                'load': gpu['load'],
+                'temp': gpu['temp'],
+                'memory_used': gpu['memory_used'],
+                'memory_total': gpu['memory_total'],
+                'memory_percent': gpu['memory_used'] / gpu['memory_total'] * 100 if gpu['memory_total'] else 0.0
             })
         return gpu_list
     except Exception:
@@ -188,563 +833,3458 @@ def get_temperature_info():
     except Exception:
         return {}
 
-HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>System Monitor Dashboard</title>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/Chart.js/3.9.1/chart.min.js"></script>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
+class OnDemandCollector:
+    """Base for tables the sampler only refreshes while clients want them
 
-        body {
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            padding: 20px;
-            color: #333;
-        }
+    wanted() holds for `idle_after` seconds after the last request(), made
+    here or, by a worker process, through the shared snapshot block under
+    `key` (see SharedSnapshot.WANTED_KEYS). Subclasses implement sample()
+    and table(), which is what shared_extras() publishes to workers.
+    """
 
-        .container {
-            max-width: 1400px;
-            margin: 0 auto;
-        }
+    key = None
 
-        header {
-            text-align: center;
-            color: white;
-            margin-bottom: 30px;
-        }
+    def __init__(self, idle_after):
+        self.idle_after = idle_after
+        self._requested = None
+        self.sampled_at = None
 
-        header h1 {
-            font-size: 2.5em;
-            margin-bottom: 10px;
-            text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-        }
+    def request(self):
+        """Note that a client wants the table; samples once if none exists yet"""
+        self._requested = time.monotonic()
+        if self.sampled_at is None:
+            self.sample()
 
-        .timestamp {
-            font-size: 1em;
-            opacity: 0.9;
-        }
+    def wanted(self):
+        if shared_snapshot is not None and time.time() - shared_snapshot.wanted_at(self.key) < self.idle_after:
+            return True
+        return self._requested is not None and time.monotonic() - self._requested < self.idle_after
 
-        .grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 20px;
-            margin-bottom: 20px;
-        }
+class ProcessCollector(OnDemandCollector):
+    """Per-process CPU and memory usage, sampled incrementally by the sampler
 
-        .card {
-            background: white;
-            border-radius: 15px;
-            padding: 20px;
-            box-shadow: 0 10px 30px rgba(0,0,0,0.2);
-            transition: transform 0.3s ease;
-        }
+    psutil.Process objects are kept per PID between samples so
+    cpu_percent(interval=None) measures the time since the previous sample
+    without sleeping. PIDs that have exited are evicted. Sampling only runs
+    while /api/processes has been requested within the last `idle_after`
+    seconds.
+    """
 
-        .card:hover {
-            transform: translateY(-5px);
-        }
+    key = 'processes'
+    ATTRS = ['name', 'username', 'cpu_percent', 'memory_info', 'num_threads', 'status']
 
-        .card-header {
-            display: flex;
-            align-items: center;
-            margin-bottom: 15px;
-            padding-bottom: 10px;
-            border-bottom: 2px solid #f0f0f0;
-        }
+    def __init__(self, idle_after=PROCESS_IDLE_AFTER):
+        super().__init__(idle_after)
+        self._procs = {}
+        self.rows = []
 
-        .card-icon {
-            font-size: 2em;
-            margin-right: 10px;
-        }
+    def sample(self):
+        """Refresh the process table (one process_iter pass, oneshot per process)"""
+        total_memory = psutil.virtual_memory().total
+        procs = {}
+        rows = []
+        # process_iter(attrs=...) reads each process under oneshot()
+        for proc in psutil.process_iter(attrs=self.ATTRS, ad_value=None):
+            info = proc.info
+            cached = self._procs.get(proc.pid)
+            # Same PID and start time: read CPU from the object holding the previous times
+            if cached is not None and cached is not proc and cached == proc:
+                try:
+                    info['cpu_percent'] = cached.cpu_percent(interval=None)
+                    proc = cached
+                except psutil.Error:
+                    pass
+            procs[proc.pid] = proc
+            memory = info['memory_info']
+            rss = memory.rss if memory else 0
+            rows.append((
+                info['cpu_percent'] or 0.0,
+                rss,
+                proc.pid,
+                info['name'] or '',
+                info['username'] or '',
+                info['num_threads'] or 0,
+                info['status'] or '',
+                rss / total_memory * 100 if total_memory else 0.0
+            ))
+        # Dropping PIDs that were not seen evicts dead processes
+        self._procs = procs
+        self.rows = rows
+        self.sampled_at = time.time()
 
-        .card-title {
-            font-size: 1.3em;
-            font-weight: bold;
-            color: #667eea;
-        }
+    def top(self, sort='cpu', limit=25, rows=None):
+        """Return the top `limit` processes (of this table or `rows`) by `sort` using a heap selection"""
+        rows = self.rows if rows is None else rows
+        column = PROCESS_SORT_KEYS[sort]
+        top = heapq.nlargest(limit, rows, key=lambda row: row[column])
+        return [{
+            'pid': row[2],
+            'name': row[3],
+            'username': row[4],
+            'cpu_percent': row[0],
+            'memory_rss': row[1],
+            'memory_percent': row[7],
+            'num_threads': row[5],
+            'status': row[6]
+        } for row in top]
 
-        .metric {
-            margin: 10px 0;
-        }
+    def table(self):
+        return {'rows': self.rows, 'sampled_at': self.sampled_at}
 
-        .metric-label {
-            font-size: 0.9em;
-            color: #666;
-            margin-bottom: 5px;
-        }
+process_collector = ProcessCollector()
 
-        .metric-value {
-            font-size: 1.8em;
-            font-weight: bold;
-            color: #333;
-        }
+def _cgroup_limit(text):
+    """A cgroup limit as a number, or None for 'max' / v1's 'unlimited' values"""
+    text = text.strip()
+    if text == 'max' or text == '-1':
+        return None
+    value = int(text)
+    return value if value < CGROUP_UNLIMITED else None
 
-        .progress-bar {
-            width: 100%;
-            height: 25px;
-            background: #f0f0f0;
-            border-radius: 12px;
-            overflow: hidden;
-            margin-top: 8px;
-            position: relative;
-        }
+def _cgroup_flat(text):
+    """Parse 'key value' lines (cpu.stat) into {key: int}"""
+    values = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(' ')
+        if value.strip().isdigit():
+            values[key] = int(value)
+    return values
 
-        .progress-fill {
-            height: 100%;
-            background: linear-gradient(90deg, #667eea, #764ba2);
-            border-radius: 12px;
-            transition: width 0.5s ease;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            color: white;
-            font-weight: bold;
-            font-size: 0.85em;
-        }
+def _cgroup_pressure(text):
+    """The 'some avg10' stall percentage from a PSI file"""
+    for line in text.splitlines():
+        if line.startswith('some '):
+            for field in line.split()[1:]:
+                key, _, value = field.partition('=')
+                if key == 'avg10':
+                    return float(value)
+    return None
 
-        .progress-fill.warning {
-            background: linear-gradient(90deg, #f093fb, #f5576c);
-        }
+def _cgroup_io(text, version):
+    """Total (read bytes, write bytes) from v2 io.stat or v1 blkio.throttle.io_service_bytes"""
+    read = write = 0
+    for line in text.splitlines():
+        fields = line.split()
+        if version == 2:
+            for field in fields[1:]:
+                key, _, value = field.partition('=')
+                if key == 'rbytes':
+                    read += int(value)
+                elif key == 'wbytes':
+                    write += int(value)
+        elif len(fields) == 3:
+            if fields[1] == 'Read':
+                read += int(fields[2])
+            elif fields[1] == 'Write':
+                write += int(fields[2])
+    return read, write
 
-        .progress-fill.critical {
-            background: linear-gradient(90deg, #fa709a, #fee140);
-        }
+def _cgroup_name(directory, mount):
+    """A cgroup's path as /proc/self/cgroup shows it, e.g. '/system.slice/nginx.service'"""
+    relative = os.path.relpath(directory, mount)
+    return '/' if relative == '.' else '/' + relative.replace(os.sep, '/')
 
-        .stat-grid {
-            display: grid;
-            grid-template-columns: repeat(2, 1fr);
-            gap: 10px;
-            margin-top: 10px;
-        }
+class CgroupFile:
+    """One cgroup control file, re-read in place with os.pread
 
-        .stat-item {
-            background: #f8f9fa;
-            padding: 10px;
-            border-radius: 8px;
-        }
+    With keep_open the descriptor stays open between reads; that is only
+    done for this process's own cgroup, so walking a large tree for
+    /api/cgroups never holds more than one extra descriptor at a time.
+    """
 
-        .stat-item-label {
-            font-size: 0.8em;
-            color: #666;
-        }
+    def __init__(self, path, keep_open=True):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY) if keep_open else None
+        if not keep_open:
+            os.stat(path)  # missing files raise OSError here, as with keep_open
+        self.size = CGROUP_READ_SIZE
 
-        .stat-item-value {
-            font-size: 1.2em;
-            font-weight: bold;
-            color: #333;
-        }
+    def read(self):
+        """Current contents; OSError once the cgroup has been removed"""
+        fd = self.fd if self.fd is not None else os.open(self.path, os.O_RDONLY)
+        try:
+            data = os.pread(fd, self.size, 0)
+            # A full buffer may have cut the file short (io.stat on many devices)
+            while len(data) == self.size:
+                self.size *= 2
+                data = os.pread(fd, self.size, 0)
+        finally:
+            if fd is not self.fd:
+                os.close(fd)
+        return data.decode()
 
-        .chart-container {
-            grid-column: 1 / -1;
-            background: white;
-            border-radius: 15px;
-            padding: 20px;
-            box-shadow: 0 10px 30px rgba(0,0,0,0.2);
-        }
+    def close(self):
+        if self.fd is None:
+            return
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+        self.fd = None
 
-        canvas {
-            max-height: 300px;
-        }
+class CgroupReader:
+    """Counters of one cgroup turned into rates between successive samples
 
-        .core-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(80px, 1fr));
-            gap: 8px;
-            margin-top: 10px;
-        }
+    `dirs` maps a controller to the cgroup's directory: one directory for
+    every controller on v2, one per hierarchy on v1. Only files that exist
+    when the reader is built are used; the root cgroup, for one, has no
+    limits. keep_open is passed on to CgroupFile.
+    """
 
-        .core-item {
-            background: #f8f9fa;
-            padding: 8px;
-            border-radius: 8px;
-            text-align: center;
-        }
+    # name -> (controller, v2 file, v1 file)
+    FILES = {
+        'cpu_usage': ('cpuacct', 'cpu.stat', 'cpuacct.usage'),
+        'cpu_stat': ('cpu', None, 'cpu.stat'),
+        'cpu_max': ('cpu', 'cpu.max', None),
+        'cpu_quota': ('cpu', None, 'cpu.cfs_quota_us'),
+        'cpu_period': ('cpu', None, 'cpu.cfs_period_us'),
+        'memory_current': ('memory', 'memory.current', 'memory.usage_in_bytes'),
+        'memory_max': ('memory', 'memory.max', 'memory.limit_in_bytes'),
+        'io': ('blkio', 'io.stat', 'blkio.throttle.io_service_bytes'),
+        'cpu_pressure': ('cpu', 'cpu.pressure', None),
+        'memory_pressure': ('memory', 'memory.pressure', None),
+        'io_pressure': ('blkio', 'io.pressure', None),
+    }
 
-        .disk-list {
-            margin-top: 10px;
-        }
+    def __init__(self, name, dirs, version, keep_open=True):
+        self.name = name
+        self.version = version
+        self.files = {}
+        for key, (controller, v2_name, v1_name) in self.FILES.items():
+            filename = v2_name if version == 2 else v1_name
+            directory = dirs.get(controller)
+            if filename is None or directory is None:
+                continue
+            try:
+                self.files[key] = CgroupFile(os.path.join(directory, filename), keep_open)
+            except OSError:
+                pass
+        self._previous = None
 
-        .disk-item {
-            background: #f8f9fa;
-            padding: 12px;
-            border-radius: 8px;
-            margin-bottom: 10px;
-        }
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self.files = {}
 
-        .gpu-list {
-            margin-top: 10px;
-        }
+    def _read(self, key):
+        file = self.files.get(key)
+        return file.read() if file is not None else None
 
-        .gpu-item {
-            background: #f8f9fa;
-            padding: 12px;
-            border-radius: 8px;
-            margin-bottom: 10px;
-        }
+    def counters(self):
+        """Raw cumulative counters and current levels (microseconds, bytes)"""
+        values = {}
+        usage = self._read('cpu_usage')
+        if self.version == 2:
+            # v2 keeps usage and throttling together in cpu.stat
+            stat = _cgroup_flat(usage) if usage is not None else {}
+            values['usage_usec'] = stat.get('usage_usec')
+        else:
+            if usage is not None:
+                values['usage_usec'] = int(usage) / 1000
+            text = self._read('cpu_stat')
+            stat = _cgroup_flat(text) if text is not None else {}
+            if 'throttled_time' in stat:
+                stat['throttled_usec'] = stat['throttled_time'] / 1000
+        for key in ('nr_periods', 'nr_throttled', 'throttled_usec'):
+            values[key] = stat.get(key)
+        cpu_max = self._read('cpu_max')
+        if cpu_max is not None:
+            quota, _, period = cpu_max.partition(' ')
+            quota = _cgroup_limit(quota)
+            values['cpu_limit'] = quota / int(period) if quota is not None else None
+        quota = self._read('cpu_quota')
+        period = self._read('cpu_period')
+        if quota is not None and period is not None:
+            quota = _cgroup_limit(quota)
+            values['cpu_limit'] = quota / int(period) if quota is not None else None
+        current = self._read('memory_current')
+        if current is not None:
+            values['memory_current'] = int(current)
+        limit = self._read('memory_max')
+        if limit is not None:
+            values['memory_max'] = _cgroup_limit(limit)
+        io = self._read('io')
+        if io is not None:
+            values['io_read_bytes'], values['io_write_bytes'] = _cgroup_io(io, self.version)
+        for key in ('cpu_pressure', 'memory_pressure', 'io_pressure'):
+            text = self._read(key)
+            if text is not None:
+                values[key] = _cgroup_pressure(text)
+        return values
 
-        .status-indicator {
-            display: inline-block;
-            width: 12px;
-            height: 12px;
-            border-radius: 50%;
-            background: #4caf50;
-            margin-right: 5px;
-            animation: pulse 2s infinite;
-        }
+    def sample(self, now, host_cores):
+        """Usage, limits, throttling and pressure since the previous call
 
-        @keyframes pulse {
-            0%, 100% { opacity: 1; }
-            50% { opacity: 0.5; }
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <header>
-            <h1>⚡ System Monitor Dashboard</h1>
-            <div class="timestamp">
-                <span class="status-indicator"></span>
-                <span id="timestamp">Loading...</span>
-            </div>
-        </header>
-
-        <div class="grid">
-            <div class="card">
-                <div class="card-header">
-                    <div class="card-icon">💻</div>
-                    <div class="card-title">CPU Usage</div>
-                </div>
-                <div class="metric">
-                    <div class="metric-value" id="cpu-usage">--</div>
-                    <div class="progress-bar">
-                        <div class="progress-fill" id="cpu-progress">0%</div>
-                    </div>
-                </div>
-                <div class="stat-grid">
-                    <div class="stat-item">
-                        <div class="stat-item-label">Frequency</div>
-                        <div class="stat-item-value" id="cpu-freq">-- MHz</div>
-                    </div>
-                    <div class="stat-item">
-                        <div class="stat-item-label">Cores</div>
-                        <div class="stat-item-value" id="cpu-cores">--</div>
-                    </div>
-                </div>
-                <div class="core-grid" id="core-grid"></div>
-            </div>
-
-            <div class="card">
-                <div class="card-header">
-                    <div class="card-icon">🧠</div>
-                    <div class="card-title">Memory (RAM)</div>
-                </div>
-                <div class="metric">
-                    <div class="metric-value" id="ram-usage">--</div>
-                    <div class="progress-bar">
-                        <div class="progress-fill" id="ram-progress">0%</div>
-                    </div>
-                </div>
-                <div class="stat-grid">
-                    <div class="stat-item">
-                        <div class="stat-item-label">Used</div>
-                        <div class="stat-item-value" id="ram-used">-- GB</div>
-                    </div>
-                    <div class="stat-item">
-                        <div class="stat-item-label">Total</div>
-                        <div class="stat-item-value" id="ram-total">-- GB</div>
-                    </div>
-                </div>
-            </div>
-
-            <div class="card">
-                <div class="card-header">
-                    <div class="card-icon">🌐</div>
-                    <div class="card-title">Network</div>
-                </div>
-                <div class="stat-grid">
-                    <div class="stat-item">
-                        <div class="stat-item-label">↑ Sent</div>
-                        <div class="stat-item-value" id="net-sent">-- MB</div>
-                    </div>
-                    <div class="stat-item">
-                        <div class="stat-item-label">↓ Received</div>
-                        <div class="stat-item-value" id="net-recv">-- MB</div>
-                    </div>
-                </div>
-            </div>
-
-            <div class="card" id="gpu-card" style="display: none;">
-                <div class="card-header">
-                    <div class="card-icon">🎮</div>
-                    <div class="card-title">GPU</div>
-                </div>
-                <div class="gpu-list" id="gpu-list"></div>
-            </div>
-        </div>
-
-        <div class="chart-container">
-            <div class="card-header">
-                <div class="card-icon">💾</div>
-                <div class="card-title">Disk Storage</div>
-            </div>
-            <div class="disk-list" id="disk-list"></div>
-        </div>
-
-        <div class="grid">
-            <div class="chart-container">
-                <h3>CPU Usage History</h3>
-                <canvas id="cpu-chart"></canvas>
-            </div>
-            <div class="chart-container">
-                <h3>RAM Usage History</h3>
-                <canvas id="ram-chart"></canvas>
-            </div>
-        </div>
-    </div>
-
-    <script>
-        const cpuChart = new Chart(document.getElementById('cpu-chart'), {
-            type: 'line',
-            data: {
-                labels: [],
-                datasets: [{
-                    label: 'CPU %',
-                    data: [],
-                    borderColor: '#667eea',
-                    backgroundColor: 'rgba(102, 126, 234, 0.1)',
-                    tension: 0.4,
-                    fill: true
-                }]
-            },
-            options: {
-                responsive: true,
-                maintainAspectRatio: true,
-                scales: {
-                    y: {
-                        beginAtZero: true,
-                        max: 100
-                    }
-                },
-                plugins: {
-                    legend: {
-                        display: false
-                    }
-                }
-            }
-        });
-
-        const ramChart = new Chart(document.getElementById('ram-chart'), {
-            type: 'line',
-            data: {
-                labels: [],
-                datasets: [{
-                    label: 'RAM %',
-                    data: [],
-                    borderColor: '#764ba2',
-                    backgroundColor: 'rgba(118, 75, 162, 0.1)',
-                    tension: 0.4,
-                    fill: true
-                }]
-            },
-            options: {
-                responsive: true,
-                maintainAspectRatio: true,
-                scales: {
-                    y: {
-                        beginAtZero: true,
-                        max: 100
-                    }
-                },
-                plugins: {
-                    legend: {
-                        display: false
-                    }
-                }
-            }
-        });
+        Rates are None on the first call, as for interfaces in NetworkCollector.
+        """
+        values = self.counters()
+        previous, self._previous = self._previous, (now, values)
 
-        function updateProgress(elementId, value) {
-            const element = document.getElementById(elementId);
-            element.style.width = value + '%';
-            element.textContent = value + '%';
-            
-            element.className = 'progress-fill';
-            if (value > 80) {
-                element.classList.add('critical');
-            } else if (value > 60) {
-                element.classList.add('warning');
-            }
-        }
+        def rate(key, scale=1):
+            if previous is None or values.get(key) is None or previous[1].get(key) is None:
+                return None
+            elapsed = now - previous[0]
+            delta = values[key] - previous[1][key]
+            # A negative delta is a counter reset (the cgroup was recreated)
+            return delta / elapsed / scale if elapsed > 0 and delta >= 0 else None
 
-        async function fetchStats() {
-            try {
-                const response = await fetch('/api/stats');
-                const data = await response.json();
-                
-                document.getElementById('timestamp').textContent = data.timestamp;
-                
-                const cpuUsage = data.cpu.usage.toFixed(1);
-                document.getElementById('cpu-usage').textContent = cpuUsage + '%';
-                updateProgress('cpu-progress', cpuUsage);
-                document.getElementById('cpu-freq').textContent = data.cpu.freq_current.toFixed(0) + ' MHz';
-                
-                const coreGrid = document.getElementById('core-grid');
-                coreGrid.innerHTML = '';
-                data.cpu.per_core.forEach((core, index) => {
-                    const coreDiv = document.createElement('div');
-                    coreDiv.className = 'core-item';
-                    coreDiv.innerHTML = `<div style="font-size: 0.8em; color: #666;">Core ${index}</div><div style="font-weight: bold;">${core.toFixed(0)}%</div>`;
-                    coreGrid.appendChild(coreDiv);
-                });
-                
-                const ramUsage = data.memory.percent.toFixed(1);
-                document.getElementById('ram-usage').textContent = ramUsage + '%';
-                updateProgress('ram-progress', ramUsage);
-                document.getElementById('ram-used').textContent = data.memory.used;
-                document.getElementById('ram-total').textContent = data.memory.total;
-                
-                document.getElementById('net-sent').textContent = data.network.bytes_sent;
-                document.getElementById('net-recv').textContent = data.network.bytes_recv;
-                
-                if (data.gpu && data.gpu.length > 0) {
-                    document.getElementById('gpu-card').style.display = 'block';
-                    const gpuList = document.getElementById('gpu-list');
-                    gpuList.innerHTML = '';
-                    data.gpu.forEach(gpu => {
-                        const gpuDiv = document.createElement('div');
-                        gpuDiv.className = 'gpu-item';
-                        gpuDiv.innerHTML = `
-                            <div style="font-weight: bold; margin-bottom: 5px;">${gpu.name}</div>
-                            <div style="font-size: 0.9em;">Load: ${gpu.load}% | Temp: ${gpu.temp}°C</div>
-                            <div style="font-size: 0.9em;">Memory: ${gpu.memory_used}MB / ${gpu.memory_total}MB (${gpu.memory_percent}%)</div>
-                        `;
-                        gpuList.appendChild(gpuDiv);
-                    });
-                }
-                
-                const diskList = document.getElementById('disk-list');
-                diskList.innerHTML = '';
-                data.disk.forEach(disk => {
-                    const diskDiv = document.createElement('div');
-                    diskDiv.className = 'disk-item';
-                    diskDiv.innerHTML = `
-                        <div style="font-weight: bold; margin-bottom: 5px;">${disk.device} - ${disk.mountpoint}</div>
-                        <div class="progress-bar">
-                            <div class="progress-fill ${disk.percent > 80 ? 'critical' : disk.percent > 60 ? 'warning' : ''}" style="width: ${disk.percent}%">${disk.percent}%</div>
-                        </div>
-                        <div style="font-size: 0.9em; margin-top: 5px; color: #666;">Used: ${disk.used} / Total: ${disk.total} (Free: ${disk.free})</div>
-                    `;
-                    diskList.appendChild(diskDiv);
-                });
-                
-                const now = new Date().toLocaleTimeString();
-                
-                if (cpuChart.data.labels.length > 60) {
-                    cpuChart.data.labels.shift();
-                    cpuChart.data.datasets[0].data.shift();
-                }
-                cpuChart.data.labels.push(now);
-                cpuChart.data.datasets[0].data.push(data.cpu.usage);
-                cpuChart.update('none');
-                
-                if (ramChart.data.labels.length > 60) {
-                    ramChart.data.labels.shift();
-                    ramChart.data.datasets[0].data.shift();
-                }
-                ramChart.data.labels.push(now);
-                ramChart.data.datasets[0].data.push(data.memory.percent);
-                ramChart.update('none');
-                
-            } catch (error) {
-                console.error('Error fetching stats:', error);
-            }
+        cores = rate('usage_usec', 1e6)
+        limit = values.get('cpu_limit')
+        memory = values.get('memory_current')
+        memory_max = values.get('memory_max')
+        periods = rate('nr_periods')
+        throttled = rate('nr_throttled')
+        return {
+            'name': self.name,
+            'cpu_cores': cores,
+            'cpu_limit': limit,
+            'cpu_percent': cores / (limit or host_cores) * 100 if cores is not None else None,
+            'throttled_percent': throttled / periods * 100 if periods and throttled is not None else None,
+            'throttled_seconds_per_sec': rate('throttled_usec', 1e6),
+            'memory_current': memory,
+            'memory_max': memory_max,
+            'memory_percent': memory / memory_max * 100 if memory is not None and memory_max else None,
+            'io_read_bytes_per_sec': rate('io_read_bytes'),
+            'io_write_bytes_per_sec': rate('io_write_bytes'),
+            'cpu_pressure': values.get('cpu_pressure'),
+            'memory_pressure': values.get('memory_pressure'),
+            'io_pressure': values.get('io_pressure'),
         }
 
-        fetchStats();
+class CgroupCollector(OnDemandCollector):
+    """cgroup v1/v2 resource use: this process's own cgroup (its container)
+    on every sample, and every cgroup under the root while /api/cgroups has
+    been requested within the last `idle_after` seconds
+
+    The own cgroup's control files stay open between samples and are re-read
+    with pread; the breakdown opens each file per read (see CgroupFile).
+    Point `root` (SYSMON_CGROUP_ROOT) at a fake cgroupfs tree to test;
+    when this process's cgroup path does not exist under it the root
+    itself is used.
+    """
+
+    key = 'cgroups'
+    V1_CONTROLLERS = ('cpu', 'cpuacct', 'memory', 'blkio')
+
+    def __init__(self, root=CGROUP_ROOT, idle_after=CGROUP_IDLE_AFTER):
+        super().__init__(idle_after)
+        self.root = root
+        self.version = None
+        self.mounts = {}
+        if hasattr(os, 'pread') and os.path.isdir(root):
+            if os.path.exists(os.path.join(root, 'cgroup.controllers')):
+                self.version = 2
+                self.mounts = dict.fromkeys(self.V1_CONTROLLERS, root)
+            else:
+                # v1 (or hybrid, whose 'unified' mount carries no controllers):
+                # one hierarchy per entry, e.g. 'cpu,cpuacct'
+                for entry in sorted(os.listdir(root)):
+                    for controller in entry.split(','):
+                        if controller in self.V1_CONTROLLERS:
+                            self.mounts.setdefault(controller, os.path.join(root, entry))
+                if self.mounts:
+                    self.version = 1
+        self._own = None
+        self.path = None
+        self.last = None
+        self._readers = {}
+        self._scanned_at = None
+        self.groups = []
+
+    def available(self):
+        return self.version is not None
+
+    def _own_paths(self):
+        """controller -> this process's cgroup path, from /proc/self/cgroup"""
+        paths = {}
+        try:
+            with open('/proc/self/cgroup') as f:
+                for line in f:
+                    _, controllers, path = line.rstrip('\n').split(':', 2)
+                    if self.version == 2 and controllers == '':
+                        paths = dict.fromkeys(self.V1_CONTROLLERS, path)
+                    for controller in controllers.split(','):
+                        if self.version == 1 and controller in self.V1_CONTROLLERS:
+                            paths[controller] = path
+        except (OSError, ValueError):
+            pass
+        return paths
+
+    def _dirs(self, paths):
+        """controller -> directory for per-controller cgroup paths, root where missing"""
+        dirs = {}
+        for controller, mount in self.mounts.items():
+            directory = os.path.join(mount, paths.get(controller, '/').lstrip('/'))
+            dirs[controller] = directory if os.path.isdir(directory) else mount
+        return dirs
+
+    def own(self):
+        """Sample this process's cgroup"""
+        if self._own is None:
+            paths = self._own_paths()
+            dirs = self._dirs(paths)
+            main = 'memory' if 'memory' in dirs else next(iter(dirs))
+            self.path = _cgroup_name(dirs[main], self.mounts[main])
+            self._own = CgroupReader(self.path, dirs, self.version)
+        try:
+            self.last = self._own.sample(time.monotonic(), psutil.cpu_count() or 1)
+            return self.last
+        except OSError:
+            # Moved to another cgroup or the group was removed: reopen next time
+            self._own.close()
+            self._own = None
+            raise
+
+    def limited(self):
+        """True when this process's cgroup has a CPU or memory limit (a container)"""
+        last = self.last
+        return last is not None and (last['cpu_limit'] is not None or last['memory_max'] is not None)
+
+    def _scan(self):
+        """Open readers for new cgroups under the root and close vanished ones"""
+        # Walk the memory hierarchy on v1 (any will do; they usually mirror each other)
+        main = self.mounts.get('memory') or next(iter(self.mounts.values()))
+        found = set()
+        for directory, subdirs, _ in os.walk(main):
+            depth = directory[len(main):].count(os.sep)
+            if depth >= CGROUP_MAX_DEPTH:
+                subdirs[:] = []
+            name = _cgroup_name(directory, main)
+            found.add(name)
+            if name not in self._readers:
+                dirs = {controller: os.path.join(mount, name.lstrip('/'))
+                        for controller, mount in self.mounts.items()}
+                dirs = {controller: path for controller, path in dirs.items() if os.path.isdir(path)}
+                self._readers[name] = CgroupReader(name, dirs, self.version, keep_open=False)
+            if len(found) >= CGROUP_MAX_GROUPS:
+                break
+        for name in set(self._readers) - found:
+            self._readers.pop(name).close()
+        self._scanned_at = time.monotonic()
+
+    def sample(self):
+        """Refresh the per-cgroup breakdown"""
+        if self._scanned_at is None or time.monotonic() - self._scanned_at >= CGROUP_SCAN_INTERVAL:
+            self._scan()
+        now = time.monotonic()
+        host_cores = psutil.cpu_count() or 1
+        groups = []
+        for name, reader in list(self._readers.items()):
+            try:
+                groups.append(reader.sample(now, host_cores))
+            except (OSError, ValueError):
+                # Removed since the last scan
+                self._readers.pop(name).close()
+        self.groups = groups
+        self.sampled_at = time.time()
+
+    def top(self, sort='cpu', limit=50, groups=None):
+        """Return the top `limit` cgroups (of this breakdown or `groups`) by `sort` using a heap selection"""
+        field = CGROUP_SORT_KEYS[sort]
+        groups = self.groups if groups is None else groups
+        return heapq.nlargest(limit, groups, key=lambda group: group.get(field) or 0)
+
+    def table(self):
+        """The breakdown with what /api/cgroups reports about it"""
+        return {'groups': self.groups, 'sampled_at': self.sampled_at, 'version': self.version,
+                'self': self.path, 'scoped': cgroup_scoped()}
+
+cgroup_collector = CgroupCollector()
+
+def cgroup_scoped():
+    """Whether cpu and memory are reported against this process's cgroup limits"""
+    if CGROUP_MODE == 'off' or not cgroup_collector.available():
+        return False
+    return CGROUP_MODE == 'on' or cgroup_collector.limited()
+
+def get_cgroup_info():
+    """Resource use and limits of this process's cgroup (its container)"""
+    try:
+        return cgroup_collector.own()
+    except Exception as e:
+        return {'error': str(e)}
+
+def apply_cgroup_scope(stats):
+    """In cgroup mode, report cpu and memory against this process's cgroup limits
+
+    The host-wide figures stay in the snapshot as host_usage and host_percent.
+    """
+    group = stats.get('cgroup')
+    if not isinstance(group, dict) or 'error' in group or not cgroup_scoped():
+        return
+    cpu = stats.get('cpu')
+    if isinstance(cpu, dict) and 'usage' in cpu and group['cpu_percent'] is not None:
+        stats['cpu'] = dict(cpu, usage=round(group['cpu_percent'], 1), host_usage=cpu['usage'], scope='cgroup')
+    memory = stats.get('memory')
+    if isinstance(memory, dict) and 'total' in memory and group['memory_current'] is not None:
+        total = min(group['memory_max'] or memory['total'], memory['total'])
+        used = group['memory_current']
+        stats['memory'] = dict(memory, total=total, used=used, available=max(total - used, 0),
+                               percent=round(used / total * 100, 1), host_percent=memory['percent'],
+                               scope='cgroup')
+
+def _ring_segments(columns, head, count, capacity):
+    """Split ring columns into chronological memoryview slices (at most two)"""
+    views = [memoryview(column) for column in columns]
+    start = (head - count) % capacity
+    if start + count <= capacity:
+        return [tuple(view[start:start + count] for view in views)]
+    return [tuple(view[start:] for view in views), tuple(view[:head] for view in views)]
+
+class RingBuffer:
+    """Fixed-size ring of (timestamp, value) samples in preallocated array('d') columns"""
+
+    def __init__(self, capacity=HISTORY_CAPACITY):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.head = 0  # next write position
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, ts, value):
+        """Store one sample, overwriting the oldest when full (O(1))"""
+        i = self.head
+        self.times[i] = ts
+        self.values[i] = value
+        self.head = i + 1 if i + 1 < self.capacity else 0
+        if self.count < self.capacity:
+            self.count += 1
+
+    def extend(self, times, values):
+        """Store a run of samples given as array('d') columns with slice copies"""
+        n = len(times)
+        if n > self.capacity:
+            times, values, n = times[-self.capacity:], values[-self.capacity:], self.capacity
+        i = self.head
+        first = min(n, self.capacity - i)
+        self.times[i:i + first] = times[:first]
+        self.values[i:i + first] = values[:first]
+        if first < n:
+            self.times[:n - first] = times[first:]
+            self.values[:n - first] = values[first:]
+        self.head = (i + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def segments(self):
+        """Return the samples as up to two (times, values) memoryview pairs, oldest first"""
+        return _ring_segments((self.times, self.values), self.head, self.count, self.capacity)
+
+    def window(self, start=None, end=None):
+        """Zero-copy views of the samples with start <= ts <= end, oldest first"""
+        result = []
+        for times, values in self.segments():
+            lo = 0 if start is None else bisect_left(times, start)
+            hi = len(times) if end is None else bisect_right(times, end)
+            if lo < hi:
+                result.append((times[lo:hi], values[lo:hi]))
+        return result
+
+    def latest(self):
+        """Return the newest (timestamp, value) pair, or None when empty"""
+        if not self.count:
+            return None
+        i = self.head - 1
+        return self.times[i], self.values[i]
+
+    def tail(self, n):
+        """Return the newest n values as a plain list"""
+        values = []
+        for _, segment in self.segments():
+            values.extend(segment.tolist())
+        return values[-n:]
+
+class RollupRing:
+    """Ring of fixed-width min/max/avg/count buckets for one series at one step"""
+
+    def __init__(self, step, capacity):
+        self.step = step
+        self.capacity = capacity
+        size = min(capacity, ROLLUP_INITIAL_BUCKETS)
+        # min/max are float64 like sums so an average never falls outside them
+        self.starts = array('d', bytes(8 * size))
+        self.mins = array('d', bytes(8 * size))
+        self.maxs = array('d', bytes(8 * size))
+        self.sums = array('d', bytes(8 * size))
+        self.counts = array('I', bytes(4 * size))
+        self.head = 0  # next write position; the open bucket is head - 1
+        self.count = 0
+
+    def _grow(self):
+        """Double the columns (up to capacity); only needed before the ring first wraps"""
+        extra = min(len(self.starts), self.capacity - len(self.starts))
+        for column in (self.starts, self.mins, self.maxs, self.sums, self.counts):
+            column.frombytes(bytes(column.itemsize * extra))
+
+    def add(self, ts, value):
+        """Fold one sample into its bucket, opening a new bucket if needed (O(1))"""
+        self._fold(ts - ts % self.step, value, value, value, 1)
+
+    def add_many(self, times, values):
+        """Fold a time-ordered run of samples, one bucket at a time"""
+        i, n = 0, len(times)
+        while i < n:
+            start = times[i] - times[i] % self.step
+            j = max(bisect_left(times, start + self.step, i), i + 1)
+            chunk = values[i:j]
+            self._fold(start, min(chunk), max(chunk), sum(chunk), j - i)
+            i = j
+
+    def _fold(self, start, low, high, total, count):
+        i = self.head - 1
+        # Samples for an older bucket (clock stepped back) fold into the open one
+        if self.count and start <= self.starts[i]:
+            if low < self.mins[i]:
+                self.mins[i] = low
+            if high > self.maxs[i]:
+                self.maxs[i] = high
+            self.sums[i] += total
+            self.counts[i] += count
+            return
+        i = self.head
+        if i == len(self.starts):
+            self._grow()
+        self.starts[i] = start
+        self.mins[i] = low
+        self.maxs[i] = high
+        self.sums[i] = total
+        self.counts[i] = count
+        self.head = i + 1 if i + 1 < self.capacity else 0
+        if self.count < self.capacity:
+            self.count += 1
+
+    def window(self, start=None, end=None):
+        """Return (starts, mins, maxs, sums, counts) memoryview slices in [start, end]"""
+        result = []
+        columns = (self.starts, self.mins, self.maxs, self.sums, self.counts)
+        for segment in _ring_segments(columns, self.head, self.count, self.capacity):
+            starts = segment[0]
+            lo = 0 if start is None else bisect_left(starts, start - self.step + 1e-9)
+            hi = len(starts) if end is None else bisect_right(starts, end)
+            if lo < hi:
+                result.append(tuple(column[lo:hi] for column in segment))
+        return result
+
+class TimeSeriesStore:
+    """One ring buffer per metric name, with memory bounded by capacity, MAX_SERIES
+    and ROLLUP_MAX_SERIES"""
+
+    def __init__(self, capacity=HISTORY_CAPACITY, max_series=MAX_SERIES,
+                 tiers=ROLLUP_TIERS, raw_step=SAMPLE_INTERVAL, rollup_series=ROLLUP_MAX_SERIES):
+        self.capacity = capacity
+        self.max_series = max_series
+        self.rollup_series = rollup_series
+        self.tiers = sorted(tiers)
+        self.raw_step = raw_step
+        self._series = {}
+        self._rollups = {}
+        self._lock = threading.Lock()
+
+    def record(self, ts, metrics):
+        """Append one timestamped sample for every metric in a {name: value} dict"""
+        with self._lock:
+            for name, value in metrics.items():
+                buf = self._series.get(name)
+                if buf is None:
+                    if len(self._series) >= self.max_series:
+                        continue
+                    buf = self._series[name] = RingBuffer(self.capacity)
+                    self._add_rollups(name)
+                buf.append(ts, value)
+                for rollup in self._rollups.get(name, ()):
+                    rollup.add(ts, value)
+
+    def record_batch(self, columns):
+        """Append runs of samples, {name: (times, values)} as array('d') columns, under one lock"""
+        with self._lock:
+            for name, (times, values) in columns.items():
+                buf = self._series.get(name)
+                if buf is None:
+                    if len(self._series) >= self.max_series:
+                        continue
+                    buf = self._series[name] = RingBuffer(self.capacity)
+                    self._add_rollups(name)
+                buf.extend(times, values)
+                for rollup in self._rollups.get(name, ()):
+                    rollup.add_many(times, values)
+
+    def _add_rollups(self, name):
+        if len(self._rollups) < self.rollup_series:
+            self._rollups[name] = [RollupRing(step, size) for step, size in self.tiers]
+
+    def query(self, name, start, end, step):
+        """Return columnar min/max/avg/count points from the coarsest tier finer than step"""
+        with self._lock:
+            buf = self._series.get(name)
+            if buf is None:
+                return None
+            tier = None
+            for rollup in self._rollups.get(name, ()):
+                if rollup.step <= step:
+                    tier = rollup
+            result = {'step': tier.step if tier else self.raw_step,
+                      't': [], 'min': [], 'max': [], 'avg': [], 'count': []}
+            if tier is None:
+                for times, values in buf.window(start, end):
+                    values = values.tolist()
+                    result['t'].extend(times.tolist())
+                    result['min'].extend(values)
+                    result['max'].extend(values)
+                    result['avg'].extend(values)
+                    result['count'].extend([1] * len(values))
+                return result
+            for starts, mins, maxs, sums, counts in tier.window(start, end):
+                counts = counts.tolist()
+                result['t'].extend(starts.tolist())
+                result['min'].extend(mins.tolist())
+                result['max'].extend(maxs.tolist())
+                result['avg'].extend(s / c for s, c in zip(sums.tolist(), counts))
+                result['count'].extend(counts)
+            return result
+
+    def names(self):
+        """Return the names of all stored series"""
+        with self._lock:
+            return sorted(self._series)
+
+    def window(self, name, start=None, end=None):
+        """Zero-copy (times, values) views for one series, see RingBuffer.window"""
+        with self._lock:
+            buf = self._series.get(name)
+            return buf.window(start, end) if buf is not None else []
+
+    def tail(self, name, n):
+        """Return the newest n values of one series as a list"""
+        with self._lock:
+            buf = self._series.get(name)
+            return buf.tail(n) if buf is not None else []
+
+class MatrixRing:
+    """Fixed-size ring of rows of readings, one column per core or sensor
+
+    Rows live in one capacity x width float32 matrix (a numpy array when
+    numpy is installed, else a flat array('f')), so a tile query reduces
+    whole blocks instead of walking one series per column. Columns are added
+    as new labels appear, reallocating the matrix; missing readings are NaN.
+    """
+
+    def __init__(self, capacity=HEATMAP_CAPACITY, max_columns=HEATMAP_MAX_COLUMNS):
+        self.capacity = capacity
+        self.max_columns = max_columns
+        self.labels = []
+        self._index = {}
+        self.times = array('d', bytes(8 * capacity))
+        self.values = None  # allocated with the first row
+        self.width = 0
+        self.np = None  # numpy, or False without it; resolved on first use
+        self.head = 0  # next write position
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def _resize(self, width):
+        """Reallocate the matrix for width columns, keeping the stored rows"""
+        if self.np is None:
+            self.np = optional_import('numpy') or False
+        old, old_width = self.values, self.width
+        if self.np:
+            self.values = self.np.full((self.capacity, width), self.np.nan, dtype=self.np.float32)
+            if old is not None:
+                self.values[:, :old_width] = old
+        else:
+            self.values = array('f', [math.nan]) * (self.capacity * width)
+            if old is not None:
+                for row in range(self.capacity):
+                    self.values[row * width:row * width + old_width] = old[row * old_width:(row + 1) * old_width]
+        self.width = width
+
+    def append(self, ts, labels, values):
+        """Store one row of readings for labels, overwriting the oldest when full"""
+        with self._lock:
+            if labels != self.labels:
+                for label in labels:
+                    if label not in self._index and len(self.labels) < self.max_columns:
+                        self._index[label] = len(self.labels)
+                        self.labels.append(label)
+                if self.width != len(self.labels):
+                    self._resize(len(self.labels))
+                row = [math.nan] * self.width
+                for label, value in zip(labels, values):
+                    if label in self._index:
+                        row[self._index[label]] = value
+                values = row
+            if not self.width:
+                return
+            i, width = self.head, self.width
+            self.times[i] = ts
+            if self.np:
+                self.values[i] = values
+            else:
+                self.values[i * width:(i + 1) * width] = array('f', values)
+            self.head = i + 1 if i + 1 < self.capacity else 0
+            if self.count < self.capacity:
+                self.count += 1
+
+    def tiles(self, start, end, step, cols):
+        """Downsample [start, end] into step-second rows and at most cols column groups
+
+        Returns {'step', 't', 'labels', 'rows', 'cols', 'mean', 'max'}: mean
+        and max are row-major float32 vectors (NaN where a cell had no
+        readings) and each column group is labelled by its first column.
+        """
+        with self._lock:
+            times = []
+            for segment, in _ring_segments((self.times,), self.head, self.count, self.capacity):
+                times.extend(segment.tolist())
+            lo, hi = bisect_left(times, start), bisect_right(times, end)
+            if lo >= hi or not self.width:
+                return {'step': step, 't': [], 'labels': [], 'rows': 0, 'cols': 0,
+                        'mean': array('f'), 'max': array('f')}
+            group = -(-self.width // max(cols, 1))
+            oldest = (self.head - self.count) % self.capacity
+            reduce = self._reduce_numpy if self.np else self._reduce_python
+            t, mean, high = reduce(oldest + lo, times[lo:hi], step, group)
+            return {'step': step, 't': t, 'labels': self.labels[::group], 'rows': len(t),
+                    'cols': -(-self.width // group), 'mean': mean, 'max': high}
+
+    def _reduce_numpy(self, first, times, step, group):
+        np = self.np
+        block = self.values[(first + np.arange(len(times))) % self.capacity]
+        buckets = np.floor(np.asarray(times) / step)
+        row_starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+        col_starts = np.arange(0, self.width, group)
+        valid = ~np.isnan(block)
+        sums = np.add.reduceat(np.add.reduceat(np.where(valid, block, 0), row_starts, axis=0), col_starts, axis=1)
+        counts = np.add.reduceat(np.add.reduceat(valid.astype(np.float32), row_starts, axis=0), col_starts, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = sums / counts
+        # fmax skips NaN, so a cell is NaN only if all its readings were missing
+        high = np.fmax.reduceat(np.fmax.reduceat(block, row_starts, axis=0), col_starts, axis=1)
+        return ((buckets[row_starts] * step).tolist(), mean.astype(np.float32).ravel(),
+                high.astype(np.float32).ravel())
+
+    def _reduce_python(self, first, times, step, group):
+        width = self.width
+        ncols = -(-width // group)
+        column_groups = [c // group for c in range(width)]
+        t, sums, counts, high = [], [], [], []
+        bucket = None
+        for k, ts in enumerate(times):
+            if ts // step != bucket:
+                bucket = ts // step
+                t.append(bucket * step)
+                sums.extend([0.0] * ncols)
+                counts.extend([0] * ncols)
+                high.extend([math.nan] * ncols)
+            base = len(sums) - ncols
+            i = (first + k) % self.capacity
+            for c, value in enumerate(self.values[i * width:(i + 1) * width]):
+                if value == value:
+                    cell = base + column_groups[c]
+                    sums[cell] += value
+                    counts[cell] += 1
+                    if not high[cell] >= value:
+                        high[cell] = value
+        mean = array('f', (s / n if n else math.nan for s, n in zip(sums, counts)))
+        return t, mean, array('f', high)
+
+class HeatmapStore:
+    """Per-core CPU usage and per-sensor temperature history for /api/heatmap"""
+
+    UNITS = {'cpu': '%', 'temp': '°C'}
+
+    def __init__(self, capacity=HEATMAP_CAPACITY):
+        self.rings = {kind: MatrixRing(capacity) for kind in self.UNITS}
+        self._core_labels = []
+
+    def record(self, ts, stats):
+        """Append a row per kind from a stats snapshot's cpu and temperature sections"""
+        per_core = stats.get('cpu', {}).get('per_core')
+        if per_core:
+            if len(self._core_labels) != len(per_core):
+                self._core_labels = [str(i) for i in range(len(per_core))]
+            self.rings['cpu'].append(ts, self._core_labels, per_core)
+        labels, values = [], []
+        for chip, entries in stats.get('temperature', {}).items():
+            for index, entry in enumerate(entries):
+                value = _number(entry.get('current'))
+                if value is not None:
+                    labels.append(f"{chip}.{entry.get('label') or index}")
+                    values.append(value)
+        if labels:
+            self.rings['temp'].append(ts, labels, values)
+
+    def tiles(self, kind, start, end, step, cols):
+        result = self.rings[kind].tiles(start, end, step, cols)
+        result.update({'kind': kind, 'unit': self.UNITS[kind], 'from': start, 'to': end})
+        return result
+
+class Segment:
+    """One memory-mapped segment file of fixed-size (time, value, series id) records
+
+    Layout: a 64 byte header followed by three columns sized for `capacity`
+    records: float64 timestamps, float32 values and uint32 series ids.
+    """
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        self.writable = writable
+        self._file = open(path, 'r+b' if writable else 'rb')
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self._map = mmap.mmap(self._file.fileno(), 0, access=access)
+        magic, version, capacity, start, end, count = SEGMENT_HEADER.unpack_from(self._map)
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a metric segment")
+        self.capacity = capacity
+        self.start = start
+        self.end = end
+        self.count = count
+        self.values_offset = SEGMENT_HEADER_SIZE + 8 * capacity
+        self.ids_offset = self.values_offset + 4 * capacity
+        view = memoryview(self._map)
+        self.times = view[SEGMENT_HEADER_SIZE:self.values_offset].cast('d')
+        self.values = view[self.values_offset:self.ids_offset].cast('f')
+        self.ids = view[self.ids_offset:self.ids_offset + 4 * capacity].cast('I')
+        view.release()
+
+    @classmethod
+    def create(cls, path, start, capacity):
+        """Create a preallocated segment file and open it for appending"""
+        with open(path, 'wb') as f:
+            f.truncate(SEGMENT_HEADER_SIZE + 20 * capacity)
+            f.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, capacity, start, start, 0))
+        return cls(path, writable=True)
+
+    @staticmethod
+    def read_header(path):
+        """Read (start, end, count) from a segment without mapping it"""
+        with open(path, 'rb') as f:
+            magic, version, capacity, start, end, count = SEGMENT_HEADER.unpack(f.read(SEGMENT_HEADER.size))
+        return start, end, count
+
+    def free(self):
+        return self.capacity - self.count
+
+    def append(self, ts, samples):
+        """Write (series id, value) pairs for one timestamp, then publish the new count"""
+        i = self.count
+        for sid, value in samples:
+            self.times[i] = ts
+            self.values[i] = value
+            self.ids[i] = sid
+            i += 1
+        self.count = i
+        self.end = ts
+        # Readers trust the header count, so it is updated after the records
+        SEGMENT_HEADER.pack_into(self._map, 0, SEGMENT_MAGIC, SEGMENT_VERSION,
+                                 self.capacity, self.start, self.end, self.count)
+
+    def scan(self, sid, start, end):
+        """Yield (ts, value) for one series in [start, end] straight from the mapped columns"""
+        count = SEGMENT_HEADER.unpack_from(self._map)[5]
+        lo = bisect_left(self.times, start, 0, count)
+        hi = bisect_right(self.times, end, lo, count)
+        if lo >= hi:
+            return
+        # Let mmap.find locate the id in C instead of looping over every record
+        pattern = struct.pack('<I', sid)
+        base = self.ids_offset
+        limit = base + 4 * hi
+        pos = self._map.find(pattern, base + 4 * lo, limit)
+        while pos != -1:
+            if (pos - base) % 4:
+                pos = self._map.find(pattern, pos + 1, limit)
+                continue
+            i = (pos - base) // 4
+            yield self.times[i], self.values[i]
+            pos = self._map.find(pattern, pos + 4, limit)
+
+    def close(self):
+        for name in ('times', 'values', 'ids'):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+        self._map.close()
+        self._file.close()
+
+class SegmentLog:
+    """Append-only on-disk metric log made of time-rotated, memory-mapped segments"""
+
+    def __init__(self, directory, segment_seconds=SEGMENT_SECONDS, retention=HISTORY_RETENTION,
+                 step=HISTORY_LOG_STEP, max_series=HISTORY_LOG_MAX_SERIES):
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.retention = retention
+        self.step = step
+        self.max_series = max_series
+        self._bucket = None  # start of the step being averaged
+        self._pending = {}  # name -> [sum, count] for that step
+        self._lock = threading.Lock()
+        self._active = None
+        self._ids = None
+        self._names_file = None
+        self._names_read = 0  # bytes of series.txt already in _ids
+        self._segments = None  # sorted [(start, path)], read lazily
+        self._writer_pid = None  # the process appending; every other one only reads
+
+    def _list_segments(self):
+        segments = []
+        for filename in os.listdir(self.directory):
+            if filename.startswith('seg-') and filename.endswith('.dat'):
+                try:
+                    segments.append((float(filename[4:-4]), os.path.join(self.directory, filename)))
+                except ValueError:
+                    continue
+        self._segments = sorted(segments)
+
+    def _read_names(self):
+        """Add series appended to series.txt since the last read (whole lines only)"""
+        try:
+            with open(os.path.join(self.directory, 'series.txt'), 'rb') as f:
+                f.seek(self._names_read)
+                data = f.read()
+        except OSError:
+            return
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].decode('utf-8').splitlines():
+            self._ids.setdefault(line, len(self._ids))
+        self._names_read += end
+
+    def _load(self):
+        # Only file names are read at startup; segments are mapped on demand
+        if self._segments is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._list_segments()
+        self._ids = {}
+        self._read_names()
+        self._names_file = open(os.path.join(self.directory, 'series.txt'), 'a', encoding='utf-8')
+
+    def _refresh(self):
+        """In a reader (an HTTP worker process), pick up the segments and
+        series the writing process has added since the last query
+
+        A worker forked from the writer inherits its state, so the writer is
+        told apart by process id rather than by a flag.
+        """
+        if self._writer_pid == os.getpid():
+            return
+        try:
+            self._list_segments()
+        except OSError:
+            pass
+        self._read_names()
+
+    def _series_id(self, name):
+        sid = self._ids.get(name)
+        if sid is None:
+            sid = self._ids[name] = len(self._ids)
+            self._names_file.write(name + '\n')
+            self._names_file.flush()
+        return sid
+
+    def _rotate(self, ts, needed):
+        if self._active is not None:
+            self._active.close()
+            self._active = None
         
-        fetch('/api/system')
-            .then(response => response.json())
-            .then(data => {
-                document.getElementById('cpu-cores').textContent = `${data.cpu_cores}/${data.cpu_threads}`;
-            });
+        # Reuse the newest segment after a restart if it still has room
+        if self._segments:
+            start, path = self._segments[-1]
+            if ts < start + self.segment_seconds:
+                try:
+                    segment = Segment(path, writable=True)
+                    if segment.free() >= needed:
+                        self._active = segment
+                        return
+                    segment.close()
+                except (OSError, ValueError):
+                    pass
         
-        setInterval(fetchStats, 2000);
-    </script>
-</body>
-</html>
-"""
+        start = ts - ts % self.segment_seconds
+        if self._segments and start <= self._segments[-1][0]:
+            start = ts  # previous segment for this period filled up early
+        capacity = max(SEGMENT_MIN_RECORDS, int(needed * self.segment_seconds / self.step * 1.25))
+        path = os.path.join(self.directory, f"seg-{start:.0f}.dat")
+        self._active = Segment.create(path, start, capacity)
+        self._segments.append((start, path))
+        self._enforce_retention(ts)
 
-@app.route('/')
-def index():
-    """Serve the dashboard HTML"""
-    return HTML_TEMPLATE
+    def _enforce_retention(self, now):
+        # Retention works on whole files: drop segments whose period has expired
+        while len(self._segments) > 1 and self._segments[1][0] < now - self.retention:
+            _, path = self._segments.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
 
-@app.route('/api/system')
-def api_system():
-    """API endpoint for system information"""
-    return jsonify(get_system_info())
+    def append(self, ts, metrics):
+        """Fold one timestamped {name: value} sample into the open step; each
+        finished step is persisted as one averaged record per series"""
+        with self._lock:
+            self._load()
+            self._writer_pid = os.getpid()
+            bucket = ts - ts % self.step
+            if bucket != self._bucket:
+                if self._pending:
+                    self._write(self._bucket, self._pending)
+                self._bucket, self._pending = bucket, {}
+            pending = self._pending
+            for name, value in metrics.items():
+                entry = pending.get(name)
+                if entry is None:
+                    pending[name] = [value, 1]
+                else:
+                    entry[0] += value
+                    entry[1] += 1
 
-@app.route('/api/stats')
-def api_stats():
-    """API endpoint for all system stats"""
-    global cpu_history, ram_history
-    
-    cpu_info = get_cpu_info()
-    ram_info = get_memory_info()
-    
-    cpu_history.append(cpu_info.get('usage', 0))
-    ram_history.append(ram_info.get('percent', 0))
-    
-    if len(cpu_history) > MAX_HISTORY:
-        cpu_history.pop(0)
-    if len(ram_history) > MAX_HISTORY:
-        ram_history.pop(0)
-    
-    stats = {
-        'cpu': cpu_info,
-        'memory': ram_info,
-        'disk': get_disk_info(),
-        'network': get_network_info(),
-        'gpu': get_gpu_info(),
-        'temperature': get_temperature_info(),
-        'history': {
-            'cpu': cpu_history,
-            'ram': ram_history
-        },
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    }
-    return jsonify(stats)
+    def _write(self, ts, pending):
+        samples = []
+        for name, (total, count) in pending.items():
+            if name in self._ids or len(self._ids) < self.max_series:
+                samples.append((self._series_id(name), total / count))
+        if not samples:
+            return
+        active = self._active
+        if active is None or ts >= active.start + self.segment_seconds or active.free() < len(samples):
+            self._rotate(ts, len(samples))
+        self._active.append(ts, samples)
 
-if __name__ == '__main__':
-    import webbrowser
-    import threading
-    
-    def open_browser():
-        webbrowser.open('http://localhost:5000')  # Match your port
-    
-    timer = threading.Timer(1.5, open_browser)
-    timer.daemon = True
-    timer.start()
-    
-    print("=" * 60)
-    print("          SYSTEM MONITOR DASHBOARD v1.3")
-    print("=" * 60)
-    print()
-    print("  ✅ Server running successfully")
-    print("  🌐 Dashboard opened in your browser")
-    print("  🔄 Monitoring in real-time...")
-    print()
-    print("  ⚠️  DO NOT CLOSE THIS WINDOW")
+    def after_fork(self):
+        """In a forked worker: drop the parent's writer state and reload lazily"""
+        self._lock = threading.Lock()
+        self._active = None
+        self._names_file = None
+        self._segments = None
+        self._ids = None
+        self._names_read = 0
+
+    def names(self):
+        """Return the names of all logged series"""
+        with self._lock:
+            self._load()
+            self._refresh()
+            return sorted(self._ids)
+
+    def query(self, name, start, end, step):
+        """Return columnar min/max/avg/count points for one series bucketed by step"""
+        with self._lock:
+            self._load()
+            self._refresh()
+            sid = self._ids.get(name)
+            segments = list(self._segments)
+        if sid is None:
+            return None
+        
+        step = max(step, self.step)
+        buckets = {}
+
+        def collect(segment):
+            for ts, value in segment.scan(sid, start, end):
+                key = ts - ts % step
+                bucket = buckets.get(key)
+                if bucket is None:
+                    buckets[key] = [value, value, value, 1]
+                else:
+                    if value < bucket[0]:
+                        bucket[0] = value
+                    if value > bucket[1]:
+                        bucket[1] = value
+                    bucket[2] += value
+                    bucket[3] += 1
+
+        for seg_start, path in segments:
+            if seg_start > end:
+                break
+            with self._lock:
+                # The writer's map is scanned under the lock so a rotation cannot close it mid-scan
+                if self._active is not None and self._active.path == path:
+                    collect(self._active)
+                    continue
+            try:
+                # The header is the segment's time-range index
+                _, seg_end, count = Segment.read_header(path)
+                if seg_end < start or not count:
+                    continue
+                segment = Segment(path)
+            except (OSError, ValueError, struct.error):
+                continue
+            try:
+                collect(segment)
+            finally:
+                segment.close()
+        
+        result = {'step': step, 't': [], 'min': [], 'max': [], 'avg': [], 'count': []}
+        for key in sorted(buckets):
+            low, high, total, count = buckets[key]
+            result['t'].append(key)
+            result['min'].append(low)
+            result['max'].append(high)
+            result['avg'].append(total / count)
+            result['count'].append(count)
+        return result
+
+def _number(value):
+    """Return a collector value as float, or None for non-numeric fields"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+def flatten_stats(stats):
+    """Flatten a stats snapshot into {'cpu.usage': 12.5, 'disk./.percent': 40.1, ...}"""
+    metrics = {}
+
+    def add(name, value):
+        number = _number(value)
+        if number is not None:
+            metrics[name] = number
+
+    def add_all(prefix, info, skip=()):
+        if isinstance(info, dict):
+            for key, value in info.items():
+                if key not in skip:
+                    add(f"{prefix}.{key}", value)
+
+    cpu = stats.get('cpu', {})
+    add_all('cpu', cpu, skip=('per_core',))
+    for index, value in enumerate(cpu.get('per_core', [])):
+        add(f"cpu.core.{index}", value)
+
+    add_all('memory', stats.get('memory'))
+    add_all('monitor', stats.get('monitor'))
+    add_all('cgroup', stats.get('cgroup'))
+    network = stats.get('network', {})
+    add_all('network', network, skip=('interfaces',))
+    for nic, rates in network.get('interfaces', {}).items():
+        add_all(f"network.nic.{nic}", rates)
+
+    disks = stats.get('disk')
+    if isinstance(disks, list):
+        for disk in disks:
+            add_all(f"disk.{disk['mountpoint']}", disk, skip=('device', 'mountpoint', 'fstype'))
+    for name, rates in stats.get('disk_io', {}).items():
+        add_all(f"disk_io.{name}", rates)
+
+    for gpu in stats.get('gpu', []):
+        add_all(f"gpu.{gpu['id']}", gpu, skip=('id', 'name'))
+
+    for chip, entries in stats.get('temperature', {}).items():
+        for index, entry in enumerate(entries):
+            add(f"temp.{chip}.{entry.get('label') or index}", entry.get('current'))
+
+    return metrics
+
+metric_store = TimeSeriesStore()
+heatmap_store = HeatmapStore()
+metric_log = SegmentLog(os.path.join(DATA_DIR, 'history')) if DATA_DIR else None
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+ALERT_OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+                   '==': operator.eq, '!=': operator.ne}
+ALERT_RULE_PATTERN = re.compile(
+    r'^(?:(?P<name>[\w.-]+):\s+)?'
+    r'(?:(?P<func>avg|min|max)\(\s*(?P<agg_metric>.+?)\s*,\s*(?P<window>\d+(?:\.\d+)?[smhd]?)\s*\)|(?P<metric>.+?))'
+    r'\s*(?P<op>>=|<=|==|!=|>|<)\s*(?P<threshold>-?\d+(?:\.\d+)?)'
+    r'(?:\s+for\s+(?P<duration>\d+(?:\.\d+)?[smhd]?))?'
+    r'(?:\s+clear\s+(?P<clear>-?\d+(?:\.\d+)?))?\s*$')
+
+def parse_duration(text):
+    """'90' or '90s' -> 90.0, '2m' -> 120.0, '1h' -> 3600.0"""
+    if text[-1] in DURATION_UNITS:
+        return float(text[:-1]) * DURATION_UNITS[text[-1]]
+    return float(text)
+
+class WindowAggregate:
+    """avg, min or max over the last `window` seconds, O(1) amortized per sample
+
+    avg keeps a running sum over a deque of samples. min/max keep a
+    monotonic deque whose front is the extreme, so expiring old samples never
+    needs a rescan.
+    """
+
+    def __init__(self, func, window):
+        self.func = func
+        self.window = window
+        self._samples = deque()
+        self._sum = 0.0
+
+    def add(self, ts, value):
+        """Add a sample and return the aggregate over the window ending at ts"""
+        samples = self._samples
+        cutoff = ts - self.window
+        if self.func == 'avg':
+            samples.append((ts, value))
+            self._sum += value
+            while samples[0][0] <= cutoff:
+                self._sum -= samples.popleft()[1]
+            return self._sum / len(samples)
+        dominated = operator.le if self.func == 'min' else operator.ge
+        while samples and dominated(value, samples[-1][1]):
+            samples.pop()
+        samples.append((ts, value))
+        while samples[0][0] <= cutoff:
+            samples.popleft()
+        return samples[0][1]
+
+class AlertRule:
+    """A threshold rule on one flattened metric, e.g. 'cpu-high: cpu.usage > 90 for 2m'
+
+    Syntax: [name:] metric op threshold [for duration] [clear value], where
+    metric may be wrapped as avg|min|max(metric, window). The condition must
+    hold on every sample for `duration` before the rule fires, and a firing
+    rule resolves only once the value crosses back past `clear` (hysteresis).
+    """
+
+    def __init__(self, text):
+        match = ALERT_RULE_PATTERN.match(text.strip())
+        if match is None:
+            raise ValueError(f"Cannot parse alert rule '{text}'")
+        self.text = text.strip()
+        self.metric = match['agg_metric'] or match['metric']
+        self.name = match['name'] or self.text
+        self.op = match['op']
+        self.threshold = float(match['threshold'])
+        self.duration = parse_duration(match['duration']) if match['duration'] else 0.0
+        self.aggregate = None
+        if match['func']:
+            window = parse_duration(match['window'])
+            if window <= 0:
+                raise ValueError(f"Window of '{text}' must be longer than zero")
+            self.aggregate = WindowAggregate(match['func'], window)
+        if match['clear'] is not None:
+            self.clear = float(match['clear'])
+        elif self.op in ('>', '>='):
+            self.clear = self.threshold - abs(self.threshold) * ALERT_HYSTERESIS
+        elif self.op in ('<', '<='):
+            self.clear = self.threshold + abs(self.threshold) * ALERT_HYSTERESIS
+        else:
+            self.clear = self.threshold
+        self.state = 'ok'
+        self.since = None
+        self.value = None
+
+    def evaluate(self, ts, value):
+        """Feed one sample; return 'firing' or 'resolved' when the state flips"""
+        if self.aggregate is not None:
+            value = self.aggregate.add(ts, value)
+        self.value = value
+        compare = ALERT_OPERATORS[self.op]
+        if self.state == 'firing':
+            if not compare(value, self.clear):
+                self.state, self.since = 'ok', None
+                return 'resolved'
+            return None
+        if not compare(value, self.threshold):
+            self.state, self.since = 'ok', None
+            return None
+        if self.since is None:
+            self.since = ts
+        if ts - self.since >= self.duration:
+            self.state = 'firing'
+            return 'firing'
+        self.state = 'pending'
+        return None
+
+    def no_data(self):
+        """The metric is missing from a sample: a pending condition starts over"""
+        if self.state == 'pending':
+            self.state, self.since = 'ok', None
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'rule': self.text,
+            'metric': self.metric,
+            'state': self.state,
+            'since': self.since,
+            'value': self.value,
+            'threshold': self.threshold,
+            'clear': self.clear
+        }
+
+class FileAlertSink:
+    """Append alert events to a file as JSON lines"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, event):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(event) + '\n')
+
+class WebhookAlertSink:
+    """POST alert events as JSON to a URL from a background thread"""
+
+    def __init__(self, url, timeout=ALERT_WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._pool = DaemonPool(1, 'alert-webhook')
+
+    def send(self, event):
+        self._pool.submit(self._post, event)
+
+    def _post(self, event):
+        import urllib.request
+        request = urllib.request.Request(self.url, data=json.dumps(event).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except Exception as e:
+            print(f"Alert webhook error: {e}")
+
+class AlertEngine:
+    """Evaluates every alert rule against each sample as it is recorded
+
+    Rules are indexed by metric and each evaluation is O(1) (sustained
+    conditions keep a start time, windowed ones a WindowAggregate), so the
+    cost per sample is one dict lookup per metric plus constant work per rule.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rules = {}
+        self._by_metric = {}
+        self.events = deque(maxlen=ALERT_EVENTS_KEPT)
+        self.sinks = []
+
+    def add(self, text):
+        """Parse and add a rule (replacing one with the same name); ValueError if invalid"""
+        rule = AlertRule(text)
+        with self._lock:
+            self._remove(rule.name)
+            self.rules[rule.name] = rule
+            self._by_metric.setdefault(rule.metric, []).append(rule)
+        return rule
+
+    def remove(self, name):
+        with self._lock:
+            return self._remove(name)
+
+    def _remove(self, name):
+        rule = self.rules.pop(name, None)
+        if rule is not None:
+            rules = self._by_metric[rule.metric]
+            rules.remove(rule)
+            if not rules:
+                del self._by_metric[rule.metric]
+        return rule is not None
+
+    def load(self, path):
+        """Add the rules in a file, one per line; blank lines and # comments are skipped"""
+        with open(path) as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    self.add(line)
+
+    def evaluate(self, ts, metrics):
+        """Evaluate every rule against one flattened sample and dispatch state changes"""
+        events = []
+        with self._lock:
+            for metric, rules in self._by_metric.items():
+                value = metrics.get(metric)
+                for rule in rules:
+                    if value is None:
+                        rule.no_data()
+                        continue
+                    try:
+                        change = rule.evaluate(ts, value)
+                    except Exception as e:
+                        # One broken rule must not stop the sampler from recording
+                        print(f"Alert rule '{rule.name}' error: {e}")
+                        continue
+                    if change is not None:
+                        events.append(dict(rule.to_dict(), event=change, time=ts))
+            self.events.extend(events)
+        for event in events:
+            for sink in self.sinks:
+                try:
+                    sink.send(event)
+                except Exception as e:
+                    print(f"Alert sink error: {e}")
+
+    def firing(self):
+        with self._lock:
+            return [rule.to_dict() for rule in self.rules.values() if rule.state == 'firing']
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'rules': [rule.to_dict() for rule in self.rules.values()],
+                'events': list(self.events)
+            }
+
+alert_engine = AlertEngine()
+if ALERT_RULES_FILE:
+    alert_engine.load(ALERT_RULES_FILE)
+else:
+    for rule in DEFAULT_ALERT_RULES:
+        alert_engine.add(rule)
+if DATA_DIR:
+    alert_engine.sinks.append(FileAlertSink(os.path.join(DATA_DIR, 'alerts.jsonl')))
+if ALERT_WEBHOOK:
+    alert_engine.sinks.append(WebhookAlertSink(ALERT_WEBHOOK))
+
+def _rate_units(fields, unit):
+    return {f"{field}_per_sec": unit for field in fields}
+
+# Units for every numeric field in the v2 stats payload, keyed by section
+UNITS = {
+    'cpu': {'usage': '%', 'per_core': '%', 'freq_current': 'MHz', 'freq_max': 'MHz', 'host_usage': '%'},
+    'memory': {'total': 'B', 'available': 'B', 'used': 'B', 'percent': '%',
+               'swap_total': 'B', 'swap_used': 'B', 'swap_percent': '%', 'host_percent': '%'},
+    'disk': {'total': 'B', 'used': 'B', 'free': 'B', 'percent': '%'},
+    'disk_io': {'read_bytes_per_sec': 'B/s', 'write_bytes_per_sec': 'B/s',
+                'read_iops': '1/s', 'write_iops': '1/s'},
+    'network': {'bytes_sent': 'B', 'bytes_recv': 'B', 'packets_sent': '1', 'packets_recv': '1',
+                **_rate_units(['bytes_sent', 'bytes_recv'], 'B/s'),
+                **_rate_units(NETWORK_COUNTERS[2:], '1/s')},
+    'gpu': {'load': '%', 'temp': '°C', 'memory_used': 'MiB', 'memory_total': 'MiB', 'memory_percent': '%'},
+    'temperature': {'current': '°C'},
+    'monitor': {'cpu_percent': '%', 'memory_rss': 'B', 'threads': '1'},
+    'cgroup': {'cpu_cores': '1', 'cpu_limit': '1', 'cpu_percent': '%', 'throttled_percent': '%',
+               'throttled_seconds_per_sec': 's/s', 'memory_current': 'B', 'memory_max': 'B',
+               'memory_percent': '%', 'io_read_bytes_per_sec': 'B/s', 'io_write_bytes_per_sec': 'B/s',
+               'cpu_pressure': '%', 'memory_pressure': '%', 'io_pressure': '%'},
+}
+
+def to_v1(stats):
+    """Adapt a raw v2 snapshot to the original /api/stats string-formatted shape"""
+    v1 = dict(stats)
+    
+    memory = stats.get('memory', {})
+    if 'error' not in memory:
+        v1['memory'] = dict(memory)
+        for key in ('total', 'available', 'used', 'swap_total', 'swap_used'):
+            v1['memory'][key] = get_size(memory[key])
+    
+    if isinstance(stats.get('disk'), list):
+        v1['disk'] = [dict(disk, total=get_size(disk['total']), used=get_size(disk['used']),
+                           free=get_size(disk['free'])) for disk in stats['disk']]
+    
+    network = stats.get('network', {})
+    if 'error' not in network:
+        v1['network'] = dict(network, bytes_sent=get_size(network['bytes_sent']),
+                             bytes_recv=get_size(network['bytes_recv']))
+    
+    v1['gpu'] = [dict(gpu,
+                      load=f"{gpu['load']:.1f}",
+                      temp=f"{gpu['temp']:.1f}",
+                      memory_used=f"{gpu['memory_used']:.0f}",
+                      memory_total=f"{gpu['memory_total']:.0f}",
+                      memory_percent=f"{gpu['memory_percent']:.1f}") for gpu in stats.get('gpu', [])]
+    return v1
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with error and timeout counters"""
+
+    def __init__(self, buckets=PERF_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+            if error:
+                self.errors += 1
+
+    def timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                low = self.buckets[index - 1] if index else 0.0
+                return low + (self.buckets[index] - low) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def to_dict(self):
+        with self._lock:
+            result = {
+                'count': self.count,
+                'sum': self.sum,
+                'errors': self.errors,
+                'timeouts': self.timeouts,
+                'buckets': dict(zip([*map(str, self.buckets), '+Inf'], self.counts))
+            }
+        result['p50'] = self.quantile(0.5)
+        result['p99'] = self.quantile(0.99)
+        return result
+
+class PerfRegistry:
+    """Named latency histograms for collectors, serialization and requests
+
+    Stage names are dotted, e.g. 'collector.disk', 'serialize.v2',
+    'compress.gzip', 'request.api_stats'.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+
+    def histogram(self, stage):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, LatencyHistogram())
+        return histogram
+
+    def observe(self, stage, seconds, error=False):
+        self.histogram(stage).observe(seconds, error)
+
+    @contextmanager
+    def timer(self, stage):
+        """Time a block; an exception escaping it counts as an error"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.observe(stage, time.perf_counter() - start, True)
+            raise
+        self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage, func, *args):
+        with self.timer(stage):
+            return func(*args)
+
+    def to_dict(self):
+        return {stage: histogram.to_dict() for stage, histogram in sorted(self.histograms.items())}
+
+perf = PerfRegistry()
+
+class SamplingProfiler:
+    """Statistical profiler that samples every thread's stack with sys._current_frames
+
+    Stacks are counted in collapsed form ('thread;file:function;...' root
+    first), which flamegraph tools read directly. Toggled at runtime through
+    /api/debug/profile; it stops itself after PROFILE_MAX_SECONDS.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self.stacks = Counter()
+            self.samples = 0
+            self.started = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + PROFILE_MAX_SECONDS
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                frames = traceback.extract_stack(frame, limit=PROFILE_DEPTH)
+                stacks.append(';'.join([names.get(ident, str(ident))] +
+                                       [f"{os.path.basename(f.filename)}:{f.name}" for f in frames]))
+            with self._lock:
+                for stack in stacks:
+                    if stack not in self.stacks and len(self.stacks) >= PROFILE_MAX_STACKS:
+                        stack = '(other)'
+                    self.stacks[stack] += 1
+                self.samples += 1
+
+    def to_dict(self, limit=50):
+        with self._lock:
+            top = self.stacks.most_common(limit)
+        return {
+            'running': self.running,
+            'started': self.started,
+            'samples': self.samples,
+            'interval': self.interval,
+            'top': [{'stack': stack, 'count': count} for stack, count in top]
+        }
+
+    def collapsed(self):
+        with self._lock:
+            stacks = self.stacks.most_common()
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks)
+
+profiler = SamplingProfiler()
+
+_last_client_activity = 0.0
+_monitor_process = psutil.Process()
+
+def note_client_activity():
+    """Record that a client used the API (keeps the sampler at full rate)"""
+    global _last_client_activity
+    _last_client_activity = time.time()
+    if isinstance(sampler, SharedSnapshotReader):
+        sampler.shared.touch(_last_client_activity)
+
+def clients_active():
+    """True while a stream is open or the API was used in the last CLIENT_IDLE_AFTER seconds"""
+    if stream_hub.clients:
+        return True
+    last = _last_client_activity
+    if shared_snapshot is not None:
+        last = max(last, shared_snapshot.last_activity())
+    return time.time() - last < CLIENT_IDLE_AFTER
+
+def get_monitor_info():
+    """Get the monitor's own resource footprint"""
+    try:
+        with _monitor_process.oneshot():
+            return {
+                'cpu_percent': _monitor_process.cpu_percent(interval=None),
+                'memory_rss': _monitor_process.memory_info().rss,
+                'threads': _monitor_process.num_threads(),
+                'idle': not clients_active()
+            }
+    except Exception as e:
+        return {'error': str(e)}
+
+def sample_processes():
+    """Refresh the process table while /api/processes is in use"""
+    if process_collector.wanted():
+        process_collector.sample()
+    return None
+
+def sample_cgroups():
+    """Refresh the per-cgroup breakdown while /api/cgroups is in use"""
+    if cgroup_collector.wanted():
+        cgroup_collector.sample()
+    return None
+
+class Collector:
+    """A registered collector: a get_*_info function plus its scheduling hints
+
+    cost is 'cheap' (runs inline on the scheduler thread) or 'blocking'
+    (runs on the collector pool with a timeout). The latest value is kept so
+    a collector that is late or not due still contributes to the snapshot.
+    """
+
+    def __init__(self, key, func, cost, interval, timeout):
+        self.key = key
+        self.func = func
+        self.cost = cost
+        self.interval = interval
+        self.timeout = timeout
+        self.value = None
+        self.updated = None
+        self.next_due = 0.0
+        self.future = None
+        self.late = False
+
+    def due(self, now, tolerance=0.0):
+        return now + tolerance >= self.next_due
+
+    def set(self, value, now, factor=1.0):
+        self.value = value
+        self.updated = now
+        self.late = False
+        jitter = random.uniform(1 - COLLECTOR_JITTER, 1 + COLLECTOR_JITTER)
+        self.next_due = now + self.interval * factor * jitter
+
+    def run(self):
+        """Call the collector function, recording its latency and errors"""
+        start = time.perf_counter()
+        try:
+            value = self.func()
+        except Exception:
+            perf.observe(f"collector.{self.key}", time.perf_counter() - start, True)
+            raise
+        # get_*_info functions report failures as {'error': ...}
+        perf.observe(f"collector.{self.key}", time.perf_counter() - start,
+                     isinstance(value, dict) and 'error' in value)
+        return value
+
+COLLECTORS = {}
+
+def register_collector(key, func, cost='blocking', interval=SAMPLE_INTERVAL, timeout=COLLECTOR_TIMEOUT):
+    """Add a collector whose result is published under `key` in each snapshot"""
+    COLLECTORS[key] = Collector(key, func, cost, interval, timeout)
+
+register_collector('cpu', get_cpu_info, cost='cheap', interval=1)
+register_collector('memory', get_memory_info, cost='cheap', interval=1)
+register_collector('network', get_network_info, cost='cheap', interval=1)
+register_collector('disk_io', get_disk_io_info, interval=1)
+register_collector('gpu', get_gpu_info, interval=2)
+register_collector('processes', sample_processes, interval=2)
+register_collector('temperature', get_temperature_info, interval=5)
+register_collector('monitor', get_monitor_info, cost='cheap', interval=5)
+register_collector('disk', get_disk_info, interval=30, timeout=DISK_PROBE_TIMEOUT + 1)
+if cgroup_collector.available():
+    register_collector('cgroup', get_cgroup_info, cost='cheap', interval=1)
+    register_collector('cgroups', sample_cgroups, interval=2)
+
+collector_pool = DaemonPool(COLLECTOR_WORKERS, 'collector')
+
+async def run_collectors(collectors, now, factor=1.0, tolerance=0.0):
+    """Run the due collectors concurrently; return (whether any ran, late keys)
+
+    Blocking collectors are awaited for at most their timeout. One that
+    overruns keeps running in the background, and its result is picked up
+    on a later tick. Until then the snapshot carries its previous value.
+    factor scales every interval (idle slowdown). tolerance lets a collector
+    due slightly after this tick run now rather than a whole tick later.
+    """
+    ran = False
+    pending = []
+    for collector in collectors:
+        future = collector.future
+        if future is not None:
+            if not future.done():
+                collector.late = True
+                continue
+            collector.future = None
+            ran = True
+            try:
+                collector.set(future.result(), now, factor)
+            except Exception as e:
+                collector.set({'error': str(e)}, now, factor)
+        if not collector.due(now, tolerance):
+            continue
+        ran = True
+        if collector.cost == 'cheap':
+            try:
+                collector.set(collector.run(), now, factor)
+            except Exception as e:
+                collector.set({'error': str(e)}, now, factor)
+        else:
+            collector.future = collector_pool.submit(collector.run)
+            pending.append(collector)
+    
+    async def finish(collector):
+        try:
+            value = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(collector.future)), collector.timeout)
+        except asyncio.TimeoutError:
+            collector.late = True
+            perf.histogram(f"collector.{collector.key}").timeout()
+            return
+        except Exception as e:
+            value = {'error': str(e)}
+        collector.future = None
+        collector.set(value, now, factor)
+    
+    await asyncio.gather(*(finish(collector) for collector in pending))
+    return ran, [collector.key for collector in collectors if collector.late]
+
+# Called with (timestamp, flattened metrics) for every assembled snapshot
+sample_listeners = []
+
+def assemble_snapshot(now, late=()):
+    """Build a snapshot from every collector's latest value and record its history"""
+    stats = {key: collector.value for key, collector in COLLECTORS.items() if collector.value is not None}
+    stats['timestamp'] = datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S')
+    if late:
+        stats['late'] = list(late)
+    
+    apply_cgroup_scope(stats)
+    metrics = flatten_stats(stats)
+    metric_store.record(now, metrics)
+    heatmap_store.record(now, stats)
+    with perf.timer('alerts'):
+        alert_engine.evaluate(now, metrics)
+    firing = alert_engine.firing()
+    if firing:
+        stats['alerts'] = firing
+    for listener in sample_listeners:
+        listener(now, metrics)
+    if metric_log is not None:
+        try:
+            metric_log.append(now, metrics)
+        except OSError as e:
+            print(f"History log error: {e}")
+    stats['history'] = {
+        'cpu': metric_store.tail('cpu.usage', MAX_HISTORY),
+        'ram': metric_store.tail('memory.percent', MAX_HISTORY)
+    }
+    return stats
+
+def collect_stats():
+    """Run every collector once (concurrently) and build a stats snapshot"""
+    collectors = list(COLLECTORS.values())
+    for collector in collectors:
+        collector.next_due = 0.0
+    _, late = asyncio.run(run_collectors(collectors, time.monotonic()))
+    return assemble_snapshot(time.time(), late)
+
+class Sampler:
+    """Background thread that keeps the latest stats snapshot up to date
+
+    The thread runs an asyncio loop that ticks every `interval` seconds.
+    Each tick runs the registered collectors that are due concurrently (see
+    run_collectors) and assembles their results into a new snapshot.
+    Collectors keep their own intervals, so slow-changing data such as disk
+    usage is not re-read every tick.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self._snapshot = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+
+    def start(self):
+        """Start the sampler thread (no-op if already running)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the sampler thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def snapshot(self, timeout=5.0):
+        """Return the latest snapshot, starting the sampler on first use"""
+        if self._snapshot is None:
+            self.start()
+            self._ready.wait(timeout)
+        return self._snapshot
+
+    def _run(self):
+        asyncio.run(self._loop())
+
+    async def _loop(self):
+        # cpu_percent(interval=None) reports usage since the previous call,
+        # so prime both counters and give them a short window to settle.
+        psutil.cpu_percent(interval=None)
+        psutil.cpu_percent(interval=None, percpu=True)
+        await asyncio.sleep(0.1)
+        
+        collectors = list(COLLECTORS.values())
+        next_tick = time.monotonic()
+        idle = False
+        while not self._stop.is_set():
+            active = clients_active()
+            if active and idle:
+                # A client is back: refresh everything now, not at the idle cadence
+                for collector in collectors:
+                    collector.next_due = 0.0
+            idle = not active
+            try:
+                ran, late = await run_collectors(collectors, time.monotonic(),
+                                                 1.0 if active else IDLE_SLOWDOWN, self.interval / 2)
+                if ran or self._snapshot is None:
+                    # Swap in a fresh dict so readers never see a partial update
+                    with perf.timer('assemble'):
+                        self._snapshot = assemble_snapshot(time.time(), late)
+                    if not self._ready.is_set():
+                        startup_trace.mark('first snapshot')
+                    self._ready.set()
+                    stream_hub.publish(self._snapshot)
+                    if shared_snapshot is not None:
+                        shared_snapshot.write(self._snapshot, shared_extras())
+            except Exception as e:
+                print(f"Sampler error: {e}")
+            
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # Fell behind (slow collector), skip missed ticks
+                next_tick = time.monotonic()
+                delay = 0
+            await asyncio.sleep(delay)
+
+def json_merge_diff(old, new):
+    """Return a JSON merge patch (RFC 7386) that turns old into new"""
+    patch = {}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        elif old[key] != value:
+            if isinstance(value, dict) and isinstance(old[key], dict):
+                patch[key] = json_merge_diff(old[key], value)
+            else:
+                patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+class StreamHub:
+    """Fans each sampler snapshot out to every /api/stream client (v2 schema)
+
+    Frames are encoded once per snapshot, not once per client. There are no
+    per-client queues: a client that falls behind simply picks up the newest
+    snapshot when it is ready again (as a full frame, since it missed deltas).
+    """
+
+    def __init__(self, max_clients=None):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._full = None
+        self._delta = None
+        self._previous = None
+        self.clients = 0
+        self.max_clients = max_clients
+
+    def join(self):
+        """Count a new client; False if max_clients are already streaming"""
+        with self._cond:
+            if self.max_clients is not None and self.clients >= self.max_clients:
+                return False
+            self.clients += 1
+            return True
+
+    def leave(self):
+        with self._cond:
+            self.clients -= 1
+
+    def publish(self, stats):
+        """Encode the full frame and the delta from the previous snapshot"""
+        payload = {key: value for key, value in stats.items() if key != 'history'}
+        previous = self._previous
+        self._previous = payload
+        if not self.clients:
+            full = delta = None
+        else:
+            full = json.dumps(dict(payload, units=UNITS), separators=(',', ':'))
+            delta = json.dumps(json_merge_diff(previous, payload), separators=(',', ':')) if previous else None
+        with self._cond:
+            self._seq += 1
+            self._full = full
+            self._delta = delta
+            self._cond.notify_all()
+
+    def frames(self):
+        """Generate SSE frames for one client (counted by join()): a full frame, then deltas"""
+        last = None
+        expires = time.monotonic() + STREAM_MAX_AGE
+        while time.monotonic() < expires:
+            with self._cond:
+                self._cond.wait_for(lambda: self._seq != last and self._full is not None, STREAM_KEEPALIVE)
+                seq, full, delta = self._seq, self._full, self._delta
+            if seq == last or full is None:
+                yield ': keepalive\n\n'
+                continue
+            if last is not None and seq == last + 1 and delta is not None:
+                yield f"event: delta\nid: {seq}\ndata: {delta}\n\n"
+            else:
+                yield f"event: full\nid: {seq}\ndata: {full}\n\n"
+            last = seq
+
+class StartupTrace:
+    """Wall-clock time of each startup phase, printed by --startup-trace
+
+    Phases are marked from the main, sampler and browser threads; the
+    breakdown is printed once the first HTTP response has been sent.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.done = False
+        self.marks = [('imports done', IMPORTED_AT)]
+        try:
+            self.marks.insert(0, ('process start', psutil.Process().create_time()))
+        except psutil.Error:
+            pass
+
+    def mark(self, phase):
+        if not self.done:
+            self.marks.append((phase, time.time()))
+
+    def first_response(self, path):
+        self.mark(f"first response ({path})")
+        self.done = True
+        if self.enabled:
+            self.report()
+
+    def report(self):
+        marks = sorted(self.marks, key=lambda mark: mark[1])
+        start = previous = marks[0][1]
+        print("Startup trace (ms since start, ms since previous phase):")
+        for phase, at in marks:
+            print(f"  {(at - start) * 1000:9.1f} {(at - previous) * 1000:+9.1f}  {phase}")
+            previous = at
+
+startup_trace = StartupTrace()
+sampler = Sampler()
+# uvicorn worker processes re-import this module and get the cap through the environment
+stream_hub = StreamHub(int(os.environ[STREAM_MAX_CLIENTS_ENV]) if os.environ.get(STREAM_MAX_CLIENTS_ENV) else None)
+
+_optional_modules = {}
+
+def optional_import(name):
+    """Import an optional dependency once; returns None if it is not installed"""
+    if name not in _optional_modules:
+        try:
+            _optional_modules[name] = importlib.import_module(name)
+        except ImportError:
+            _optional_modules[name] = None
+    return _optional_modules[name]
+
+def encode_json(obj):
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+def compress(body, encoding):
+    """Compress a response body with 'br', 'gzip' or 'identity'"""
+    if encoding == 'br':
+        return optional_import('brotli').compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+def choose_encoding(size):
+    """Pick the best Content-Encoding the client accepts for a body of this size"""
+    if size < COMPRESS_MIN_SIZE:
+        return 'identity'
+    accepted = request.accept_encodings
+    if accepted['br'] and optional_import('brotli') is not None:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return 'identity'
+
+class ResponseCache:
+    """Encoded response bodies for the current snapshot
+
+    Every client polling the same snapshot shares one serialization (and one
+    compression per encoding); the cache empties when a new snapshot arrives.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._bodies = {}
+
+    def get(self, snapshot, key, build):
+        with self._lock:
+            if snapshot is not self._snapshot:
+                self._snapshot = snapshot
+                self._bodies = {}
+            body = self._bodies.get(key)
+        if body is None:
+            body = build()
+            with self._lock:
+                if snapshot is self._snapshot:
+                    self._bodies[key] = body
+        return body
+
+response_cache = ResponseCache()
+
+def encoded_response(build, mimetype, snapshot=None, variant=None):
+    """Respond with build()'s bytes, compressed per Accept-Encoding
+
+    With a snapshot, the encoded bytes are cached for that snapshot under variant.
+    """
+    def cached(encoding, make):
+        if snapshot is None:
+            return make()
+        return response_cache.get(snapshot, (variant, encoding), make)
+    
+    raw = cached('identity', lambda: perf.timed(f"serialize.{variant or mimetype}", build))
+    encoding = choose_encoding(len(raw))
+    body = raw if encoding == 'identity' else cached(encoding, lambda: perf.timed(f"compress.{encoding}", compress, raw, encoding))
+    response = Response(body, mimetype=mimetype)
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def _column_bytes(typecode, values):
+    column = array(typecode, values)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+def encode_history_binary(result):
+    """Pack a history result as little-endian columns for JavaScript TypedArrays
+
+    Layout: 24 byte header (magic b'SMTS', u16 version, u16 column count,
+    u32 rows, u32 reserved, f64 step), then Float64 t, Float32 min, max,
+    avg and Uint32 count, each `rows` long. In the browser:
+    new Float64Array(buffer, 24, rows), new Float32Array(buffer, 24 + 8 * rows, rows), ...
+    """
+    rows = len(result['t'])
+    header = HISTORY_BINARY_HEADER.pack(HISTORY_BINARY_MAGIC, 1, 5, rows, 0, result['step'])
+    return b''.join([
+        header,
+        _column_bytes('d', result['t']),
+        _column_bytes('f', result['min']),
+        _column_bytes('f', result['max']),
+        _column_bytes('f', result['avg']),
+        _column_bytes('I', result['count'])
+    ])
+
+def encode_history_msgpack(result):
+    """Pack a history result as MessagePack with the columns as binary blobs"""
+    packed = dict(result)
+    packed['t'] = _column_bytes('d', result['t'])
+    for key in ('min', 'max', 'avg'):
+        packed[key] = _column_bytes('f', result[key])
+    packed['count'] = _column_bytes('I', result['count'])
+    return optional_import('msgpack').packb(packed, use_bin_type=True)
+
+def _float32_bytes(values):
+    """Little-endian float32 bytes of an array('f') or a numpy float32 vector"""
+    if isinstance(values, array):
+        return _column_bytes('f', values)
+    return values.astype('<f4').tobytes()
+
+def encode_heatmap_binary(result):
+    """Pack heatmap tiles for JavaScript TypedArrays
+
+    Layout: 24 byte header (magic b'SMHM', u16 version, u16 reserved,
+    u32 rows, u32 cols, f64 step), Float64 t[rows], Float32 mean and max
+    [rows * cols] row-major (NaN for empty cells), then the column labels
+    as a UTF-8 JSON list filling the rest of the body.
+    """
+    header = HEATMAP_BINARY_HEADER.pack(HEATMAP_BINARY_MAGIC, 1, 0, result['rows'], result['cols'], result['step'])
+    return b''.join([
+        header,
+        _column_bytes('d', result['t']),
+        _float32_bytes(result['mean']),
+        _float32_bytes(result['max']),
+        encode_json(result['labels'])
+    ])
+
+def encode_heatmap_json(result):
+    """JSON heatmap tiles, with empty (NaN) cells as null"""
+    packed = dict(result)
+    for key in ('mean', 'max'):
+        packed[key] = [round(value, 2) if value == value else None for value in result[key].tolist()]
+    return encode_json(packed)
+
+class SharedSnapshot:
+    """Latest snapshot shared with worker processes through shared memory
+
+    Layout: u64 sequence number, u32 body length, f64 time of the last
+    client request seen by any worker, an f64 per WANTED_KEYS entry with
+    the time a worker last asked for that on-demand table, then the JSON
+    body. The writer makes the sequence odd while it copies a new body in
+    (a seqlock), so readers retry instead of decoding a half-written frame.
+    """
+
+    HEADER = struct.Struct('<QI')
+    ACTIVITY = struct.Struct('<d')
+    ACTIVITY_OFFSET = 16
+    # Tables only the sampler process can build, published under '_extras'
+    # in the body while some worker keeps asking for them (see shared_extras)
+    WANTED_KEYS = ('processes', 'cgroups')
+    WANTED_OFFSET = 24
+    BODY_OFFSET = WANTED_OFFSET + 8 * len(WANTED_KEYS)
+
+    def __init__(self, name=None, size=SHARED_SNAPSHOT_SIZE):
+        from multiprocessing import shared_memory
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                # Python < 3.13 has no track flag: keep the resource tracker
+                # from adopting (and later unlinking) the owner's block
+                from multiprocessing import resource_tracker
+                register = resource_tracker.register
+                resource_tracker.register = lambda *args: None
+                try:
+                    self.shm = shared_memory.SharedMemory(name=name)
+                finally:
+                    resource_tracker.register = register
+            self.owner = False
+        self.name = self.shm.name
+        self.pid = os.getpid()
+        self._seq = 0
+
+    def write(self, stats, extras=None):
+        """Publish a snapshot (called by the sampler in the owning process)"""
+        body = encode_json(dict(stats, _extras=extras) if extras else stats)
+        if len(body) > self.shm.size - self.BODY_OFFSET:
+            print(f"Snapshot ({len(body)} bytes) does not fit in shared memory")
+            return
+        buf = self.shm.buf
+        self.HEADER.pack_into(buf, 0, self._seq + 1, 0)
+        buf[self.BODY_OFFSET:self.BODY_OFFSET + len(body)] = body
+        self._seq += 2
+        self.HEADER.pack_into(buf, 0, self._seq, len(body))
+
+    def read(self, retries=100):
+        """Return (sequence, body bytes), or (0, None) before the first publish"""
+        buf = self.shm.buf
+        for _ in range(retries):
+            seq, length = self.HEADER.unpack_from(buf, 0)
+            if seq % 2 == 0:
+                body = bytes(buf[self.BODY_OFFSET:self.BODY_OFFSET + length])
+                if self.HEADER.unpack_from(buf, 0)[0] == seq:
+                    return seq, body if seq else None
+            time.sleep(0.001)
+        return 0, None
+
+    def touch(self, when):
+        """Record client activity in a worker so the sampler stays at full rate"""
+        self.ACTIVITY.pack_into(self.shm.buf, self.ACTIVITY_OFFSET, when)
+
+    def last_activity(self):
+        return self.ACTIVITY.unpack_from(self.shm.buf, self.ACTIVITY_OFFSET)[0]
+
+    def want(self, key, when):
+        """Record in a worker that a client asked for the on-demand table `key`"""
+        self.ACTIVITY.pack_into(self.shm.buf, self.WANTED_OFFSET + 8 * self.WANTED_KEYS.index(key), when)
+
+    def wanted_at(self, key):
+        return self.ACTIVITY.unpack_from(self.shm.buf, self.WANTED_OFFSET + 8 * self.WANTED_KEYS.index(key))[0]
+
+    def close(self):
+        self.shm.close()
+        # Forked workers inherit the atexit hook; only the creator unlinks
+        if self.owner and os.getpid() == self.pid:
+            self.shm.unlink()
+
+class SharedSnapshotReader:
+    """Drop-in for the Sampler in HTTP worker processes
+
+    It never touches psutil: snapshots come from the sampler process through
+    SharedSnapshot and are decoded once per sequence number. A light thread
+    forwards new snapshots to this worker's /api/stream clients.
+    """
+
+    def __init__(self, name, poll=SHARED_SNAPSHOT_POLL):
+        self.shared = SharedSnapshot(name)
+        self.poll = poll
+        self._seq = 0
+        self._snapshot = None
+        self._extras = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._forward, name='snapshot-reader', daemon=True)
+                self._thread.start()
+
+    def snapshot(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            seq, body = self.shared.read()
+            with self._lock:
+                if seq and seq != self._seq:
+                    snapshot = json.loads(body)
+                    self._extras = snapshot.pop('_extras', {})
+                    self._seq, self._snapshot = seq, snapshot
+                snapshot = self._snapshot
+            if snapshot is not None or time.monotonic() >= deadline:
+                return snapshot
+            time.sleep(self.poll)
+
+    def extra(self, key, timeout=5.0):
+        """Ask the sampler process for the on-demand table `key` and return
+        its latest published copy, waiting up to timeout for the first one"""
+        self.shared.want(key, time.time())
+        deadline = time.monotonic() + timeout
+        while True:
+            self.snapshot(timeout=0)
+            with self._lock:
+                value = self._extras.get(key)
+            if value is not None or time.monotonic() >= deadline:
+                return value
+            time.sleep(self.poll)
+
+    def _forward(self):
+        last = None
+        while True:
+            snapshot = self.snapshot()
+            if snapshot is not None and snapshot is not last:
+                stream_hub.publish(snapshot)
+                last = snapshot
+            if stream_hub.clients:
+                note_client_activity()
+            time.sleep(self.poll)
+
+shared_snapshot = None
+
+def shared_extras():
+    """On-demand tables that workers are asking for, published with each snapshot"""
+    extras = {}
+    for collector in (process_collector, cgroup_collector):
+        if collector.wanted() and collector.sampled_at is not None:
+            extras[collector.key] = collector.table()
+    return extras
+
+_LOCK_TYPE = type(threading.Lock())
+
+def _renew_locks(obj):
+    for attr, value in list(vars(obj).items()):
+        if isinstance(value, _LOCK_TYPE):
+            setattr(obj, attr, threading.Lock())
+        elif isinstance(value, threading.Condition):
+            setattr(obj, attr, threading.Condition())
+
+def reset_after_fork():
+    """Make a freshly forked worker safe to use
+
+    The sampler's threads may hold any of these locks at the moment gunicorn
+    forks (at startup or when it replaces a worker). Those threads do not
+    exist in the child, so such a lock would never be released.
+    """
+    global _gpu_backend_lock
+    _gpu_backend_lock = threading.Lock()
+    for obj in (system_info_cache, process_collector, cgroup_collector, network_collector, disk_collector,
+                metric_store, heatmap_store, *heatmap_store.rings.values(), alert_engine, perf,
+                *list(perf.histograms.values()), profiler, stream_hub, response_cache, static_assets):
+        _renew_locks(obj)
+    collector_pool.after_fork()
+    disk_collector._pool.after_fork()
+    if metric_log is not None:
+        metric_log.after_fork()
+
+def attach_shared_snapshot(name):
+    """Switch this (worker) process to read snapshots from the sampler process"""
+    global sampler, shared_snapshot
+    sampler = SharedSnapshotReader(name)
+    shared_snapshot = None
+
+# Worker processes spawned by uvicorn re-import this module
+if os.environ.get(SHARED_SNAPSHOT_ENV):
+    attach_shared_snapshot(os.environ[SHARED_SNAPSHOT_ENV])
+
+def encode_ingest_batch(host, rows, info=None):
+    """Pack (timestamp, {metric: value}) rows into a compact, gzipped binary batch
+
+    Layout: 16 byte header (magic b'SMIB', u16 version, u16 reserved, u32
+    rows, u32 metadata length), JSON metadata {"host", "names", "info"},
+    then Float64 timestamps and a rows x names Float32 matrix, row-major,
+    with NaN where a row has no value for a name.
+    """
+    names = {}
+    for _, metrics in rows:
+        for name in metrics:
+            names.setdefault(name, len(names))
+    width = len(names)
+    values = array('f', [math.nan]) * (len(rows) * width)
+    for row, (_, metrics) in enumerate(rows):
+        base = row * width
+        for name, value in metrics.items():
+            values[base + names[name]] = value
+    meta = encode_json({'host': host, 'names': list(names), 'info': info})
+    header = INGEST_HEADER.pack(INGEST_MAGIC, 1, 0, len(rows), len(meta))
+    body = b''.join([header, meta, _column_bytes('d', [ts for ts, _ in rows]), _column_bytes('f', values)])
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+def decode_ingest_batch(body):
+    """Inverse of encode_ingest_batch (body already decompressed): (meta, times, values)"""
+    magic, version, _, rows, meta_length = INGEST_HEADER.unpack_from(body)
+    if magic != INGEST_MAGIC or version != 1:
+        raise ValueError('Not an ingest batch')
+    offset = INGEST_HEADER.size
+    meta = json.loads(body[offset:offset + meta_length])
+    offset += meta_length
+    width = len(meta['names'])
+    if len(body) != offset + rows * 8 + rows * width * 4:
+        raise ValueError('Truncated ingest batch')
+    times = array('d', body[offset:offset + rows * 8])
+    values = array('f', body[offset + rows * 8:])
+    if sys.byteorder != 'little':
+        times.byteswap()
+        values.byteswap()
+    return meta, times, values
+
+class Agent:
+    """Batches every sample and POSTs it to a collector's /api/ingest
+
+    Samples arrive through sample_listeners, so batches carry the exact
+    sampling timestamps. A failed POST keeps its rows (up to max_rows) for
+    the next attempt, so short collector outages leave no gaps.
+    """
+
+    def __init__(self, url, name=None, batch_seconds=AGENT_BATCH_SECONDS, max_rows=AGENT_MAX_ROWS):
+        self.url = url.rstrip('/') + '/api/ingest'
+        self.name = name or socket.gethostname()
+        self.batch_seconds = batch_seconds
+        self._rows = deque(maxlen=max_rows)
+        self._lock = threading.Lock()
+        self._sent_etag = None
+        self._stop = threading.Event()
+
+    def add(self, ts, metrics):
+        with self._lock:
+            self._rows.append((ts, metrics))
+
+    def run(self):
+        """Send a batch every batch_seconds until stopped (blocks)"""
+        sample_listeners.append(self.add)
+        note_client_activity()
+        sampler.start()
+        while not self._stop.wait(self.batch_seconds):
+            # The collector is our client: keep the sampler at full rate
+            note_client_activity()
+            self.flush()
+
+    def stop(self):
+        self._stop.set()
+
+    def flush(self):
+        # Take the buffer out while sending: rows added meanwhile go to a fresh one
+        with self._lock:
+            rows, self._rows = self._rows, deque(maxlen=self._rows.maxlen)
+        if not rows:
+            return
+        # Host details go along only when they changed
+        _, etag = system_info_cache.get()
+        info = dict(system_info_cache.record) if etag != self._sent_etag else None
+        import urllib.request
+        headers = {'Content-Type': 'application/x-sysmon-batch', 'Content-Encoding': 'gzip'}
+        if INGEST_TOKEN:
+            headers['Authorization'] = f"Bearer {INGEST_TOKEN}"
+        request = urllib.request.Request(self.url, data=encode_ingest_batch(self.name, rows, info),
+                                         headers=headers, method='POST')
+        try:
+            urllib.request.urlopen(request, timeout=AGENT_TIMEOUT).close()
+        except Exception as e:
+            print(f"Agent: could not send {len(rows)} samples to {self.url}: {e}")
+            with self._lock:
+                # Put them back ahead of the newer rows; max_rows drops the oldest
+                rows.extend(self._rows)
+                self._rows = rows
+            return
+        self._sent_etag = etag
+
+class HostShard:
+    """One host's history and latest values on the collector"""
+
+    def __init__(self, host):
+        self.host = host
+        self.store = TimeSeriesStore(FLEET_HISTORY_CAPACITY, FLEET_MAX_SERIES, FLEET_ROLLUP_TIERS,
+                                     rollup_series=FLEET_MAX_SERIES)
+        self.latest = {}
+        self.info = {}
+        self.summary = {}
+        self.last_seen = None
+        self.last_sample = None
+
+class FleetStore:
+    """Collector-side storage: a TimeSeriesStore shard per host plus latest values
+
+    Each ingested batch is split into per-metric columns with strided array
+    slices and written with one record_batch call, so the per-sample Python
+    work is a handful of C-level array operations per metric.
+    """
+
+    def __init__(self, max_hosts=FLEET_MAX_HOSTS):
+        self._lock = threading.Lock()
+        self.shards = {}
+        self.max_hosts = max_hosts
+
+    def shard(self, host):
+        """The host's shard, created on first use; None once max_hosts are tracked"""
+        shard = self.shards.get(host)
+        if shard is None:
+            with self._lock:
+                shard = self.shards.get(host)
+                if shard is None and len(self.shards) < self.max_hosts:
+                    shard = self.shards[host] = HostShard(host)
+        return shard
+
+    def ingest(self, meta, times, values):
+        """Store one decoded batch; returns the number of samples stored, None
+        if the batch is from a new host and the collector is full"""
+        shard = self.shard(str(meta['host']))
+        if shard is None:
+            return None
+        names = meta['names']
+        width = len(names)
+        columns = {}
+        latest = {}
+        stored = 0
+        for index, name in enumerate(names):
+            column = array('d', values[index::width])
+            column_times = times
+            total = sum(column)
+            if total != total:
+                # Some rows have no value (NaN) for this metric
+                pairs = [(t, v) for t, v in zip(times, column) if v == v]
+                if not pairs:
+                    continue
+                column_times = array('d', [t for t, _ in pairs])
+                column = array('d', [v for _, v in pairs])
+            columns[name] = (column_times, column)
+            latest[name] = column[-1]
+            stored += len(column)
+        shard.store.record_batch(columns)
+        shard.latest.update(latest)
+        if meta.get('info'):
+            shard.info = meta['info']
+        disks = [value for name, value in shard.latest.items()
+                 if name.startswith('disk.') and name.endswith('.percent')]
+        shard.summary = {
+            'cpu': shard.latest.get('cpu.usage'),
+            'memory': shard.latest.get('memory.percent'),
+            'disk_max': max(disks) if disks else None,
+            'network_up': shard.latest.get('network.bytes_sent_per_sec'),
+            'network_down': shard.latest.get('network.bytes_recv_per_sec')
+        }
+        shard.last_seen = time.time()
+        if len(times):
+            shard.last_sample = times[-1]
+        return stored
+
+    def overview(self):
+        now = time.time()
+        hosts = []
+        for shard in list(self.shards.values()):
+            hosts.append(dict(shard.summary,
+                              host=shard.host,
+                              online=now - shard.last_seen < FLEET_OFFLINE_AFTER,
+                              last_seen=shard.last_seen,
+                              platform=shard.info.get('platform'),
+                              cpu_threads=shard.info.get('cpu_threads'),
+                              ram_total=shard.info.get('ram_total')))
+        return sorted(hosts, key=lambda host: host['host'])
+
+    def top(self, pattern, n=10, largest=True, online_only=True):
+        """Top n (host, metric, value) by latest value; pattern may use * and ? wildcards"""
+        now = time.time()
+        wildcard = any(c in pattern for c in '*?[')
+        candidates = []
+        for shard in list(self.shards.values()):
+            if online_only and now - shard.last_seen >= FLEET_OFFLINE_AFTER:
+                continue
+            latest = shard.latest
+            if wildcard:
+                candidates.extend((latest[name], shard.host, name) for name in fnmatch.filter(latest, pattern))
+            elif pattern in latest:
+                candidates.append((latest[pattern], shard.host, pattern))
+        select = heapq.nlargest if largest else heapq.nsmallest
+        return [{'host': host, 'metric': name, 'value': value}
+                for value, host, name in select(n, candidates, key=lambda item: item[0])]
+
+# Set by --collector
+fleet_store = None
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_label_value(value)}"' for key, value in labels.items()) + '}'
+
+def _section(stats, key, default):
+    value = stats.get(key, default)
+    return default if isinstance(value, dict) and 'error' in value else value
+
+def _metric_samples(stats):
+    """Yield (family, labels, value) for every exported metric in a v2 snapshot"""
+    cpu = _section(stats, 'cpu', {})
+    if 'usage' in cpu:
+        yield 'cpu_usage', '', cpu['usage']
+        yield 'cpu_frequency', '', cpu['freq_current']
+        for index, value in enumerate(cpu['per_core']):
+            yield 'cpu_core_usage', _labels(core=index), value
+    
+    memory = _section(stats, 'memory', {})
+    if 'total' in memory:
+        yield 'memory_total', '', memory['total']
+        yield 'memory_available', '', memory['available']
+        yield 'memory_used', '', memory['used']
+        yield 'memory_usage', '', memory['percent']
+        yield 'swap_total', '', memory['swap_total']
+        yield 'swap_used', '', memory['swap_used']
+        yield 'swap_usage', '', memory['swap_percent']
+    
+    for disk in _section(stats, 'disk', []):
+        labels = _labels(device=disk['device'], mountpoint=disk['mountpoint'], fstype=disk['fstype'])
+        yield 'disk_total', labels, disk['total']
+        yield 'disk_used', labels, disk['used']
+        yield 'disk_free', labels, disk['free']
+        yield 'disk_usage', labels, disk['percent']
+        yield 'disk_stale', labels, int(disk.get('stale', False))
+    for name, rates in _section(stats, 'disk_io', {}).items():
+        labels = _labels(disk=name)
+        yield 'disk_read_rate', labels, rates['read_bytes_per_sec']
+        yield 'disk_write_rate', labels, rates['write_bytes_per_sec']
+        yield 'disk_read_iops', labels, rates['read_iops']
+        yield 'disk_write_iops', labels, rates['write_iops']
+    
+    network = _section(stats, 'network', {})
+    if 'bytes_sent' in network:
+        yield 'network_sent', '', network['bytes_sent']
+        yield 'network_received', '', network['bytes_recv']
+        for nic, rates in network['interfaces'].items():
+            labels = _labels(interface=nic)
+            yield 'network_send_rate', labels, rates['bytes_sent_per_sec']
+            yield 'network_receive_rate', labels, rates['bytes_recv_per_sec']
+            yield 'network_error_rate', labels, rates['errin_per_sec'] + rates['errout_per_sec']
+            yield 'network_drop_rate', labels, rates['dropin_per_sec'] + rates['dropout_per_sec']
+    
+    for gpu in stats.get('gpu', []):
+        labels = _labels(gpu=gpu['id'], name=gpu['name'])
+        yield 'gpu_utilization', labels, gpu['load']
+        yield 'gpu_temperature', labels, gpu['temp']
+        yield 'gpu_memory_used', labels, gpu['memory_used'] * 1024 ** 2
+        yield 'gpu_memory_total', labels, gpu['memory_total'] * 1024 ** 2
+    
+    monitor = _section(stats, 'monitor', {})
+    if 'cpu_percent' in monitor:
+        yield 'monitor_cpu_usage', '', monitor['cpu_percent']
+        yield 'monitor_memory_rss', '', monitor['memory_rss']
+        yield 'monitor_idle', '', int(monitor['idle'])
+    
+    group = _section(stats, 'cgroup', {})
+    if 'cpu_percent' in group:
+        for family, key in (('cgroup_cpu_usage', 'cpu_percent'), ('cgroup_cpu_throttled', 'throttled_percent'),
+                            ('cgroup_memory_used', 'memory_current'), ('cgroup_memory_limit', 'memory_max')):
+            if group[key] is not None:
+                yield family, '', group[key]
+        for resource in ('cpu', 'memory', 'io'):
+            if group[f"{resource}_pressure"] is not None:
+                yield 'cgroup_pressure', _labels(resource=resource), group[f"{resource}_pressure"]
+    
+    for chip, entries in stats.get('temperature', {}).items():
+        for index, entry in enumerate(entries):
+            yield 'temperature', _labels(chip=chip, sensor=entry['label'] or index), entry['current']
+    
+    for alert in stats.get('alerts', []):
+        yield 'alert_firing', _labels(rule=alert['name'], metric=alert['metric']), 1
+
+def _perf_samples():
+    """Samples for this process's perf histograms
+
+    Histogram samples put their _bucket/_count/_sum suffix in front of the
+    labels, since render_metrics writes the family name then the labels.
+    """
+    for stage, histogram in sorted(perf.histograms.items()):
+        data = histogram.to_dict()
+        cumulative = 0
+        for bound, count in data['buckets'].items():
+            cumulative += count
+            yield 'perf_latency', '_bucket' + _labels(stage=stage, le=bound), cumulative
+        yield 'perf_latency', '_count' + _labels(stage=stage), data['count']
+        yield 'perf_latency', '_sum' + _labels(stage=stage), data['sum']
+        yield 'perf_errors', _labels(stage=stage), data['errors']
+        yield 'perf_timeouts', _labels(stage=stage), data['timeouts']
+
+# family -> (type, unit, help); rendered once into METRICS_HEADERS below
+METRIC_FAMILIES = {
+    'cpu_usage': ('gauge', 'percent', 'Overall CPU usage'),
+    'cpu_frequency': ('gauge', 'megahertz', 'Current CPU frequency'),
+    'cpu_core_usage': ('gauge', 'percent', 'Per-core CPU usage'),
+    'memory_total': ('gauge', 'bytes', 'Total physical memory'),
+    'memory_available': ('gauge', 'bytes', 'Available physical memory'),
+    'memory_used': ('gauge', 'bytes', 'Used physical memory'),
+    'memory_usage': ('gauge', 'percent', 'Physical memory usage'),
+    'swap_total': ('gauge', 'bytes', 'Total swap'),
+    'swap_used': ('gauge', 'bytes', 'Used swap'),
+    'swap_usage': ('gauge', 'percent', 'Swap usage'),
+    'disk_total': ('gauge', 'bytes', 'Filesystem size'),
+    'disk_used': ('gauge', 'bytes', 'Filesystem space used'),
+    'disk_free': ('gauge', 'bytes', 'Filesystem space free'),
+    'disk_usage': ('gauge', 'percent', 'Filesystem usage'),
+    'disk_stale': ('gauge', '', '1 if the mount stopped answering and values are last known'),
+    'disk_read_rate': ('gauge', 'bytes_per_second', 'Disk read throughput'),
+    'disk_write_rate': ('gauge', 'bytes_per_second', 'Disk write throughput'),
+    'disk_read_iops': ('gauge', '', 'Disk read operations per second'),
+    'disk_write_iops': ('gauge', '', 'Disk write operations per second'),
+    'network_sent': ('counter', 'bytes', 'Bytes sent on all interfaces'),
+    'network_received': ('counter', 'bytes', 'Bytes received on all interfaces'),
+    'network_send_rate': ('gauge', 'bytes_per_second', 'Interface send throughput'),
+    'network_receive_rate': ('gauge', 'bytes_per_second', 'Interface receive throughput'),
+    'network_error_rate': ('gauge', '', 'Interface errors per second'),
+    'network_drop_rate': ('gauge', '', 'Interface dropped packets per second'),
+    'gpu_utilization': ('gauge', 'percent', 'GPU utilization'),
+    'gpu_temperature': ('gauge', 'celsius', 'GPU temperature'),
+    'gpu_memory_used': ('gauge', 'bytes', 'GPU memory used'),
+    'gpu_memory_total': ('gauge', 'bytes', 'GPU memory total'),
+    'temperature': ('gauge', 'celsius', 'Hardware sensor temperature'),
+    'monitor_cpu_usage': ('gauge', 'percent', 'CPU used by the monitor process itself'),
+    'monitor_memory_rss': ('gauge', 'bytes', 'Resident memory of the monitor process'),
+    'monitor_idle': ('gauge', '', '1 while no clients are connected and sampling is slowed down'),
+    'cgroup_cpu_usage': ('gauge', 'percent', "CPU used by the monitor's cgroup, of its limit or of the host"),
+    'cgroup_cpu_throttled': ('gauge', 'percent', "Share of CFS periods in which the monitor's cgroup was throttled"),
+    'cgroup_memory_used': ('gauge', 'bytes', "Memory charged to the monitor's cgroup"),
+    'cgroup_memory_limit': ('gauge', 'bytes', "Memory limit of the monitor's cgroup"),
+    'cgroup_pressure': ('gauge', 'percent', "Share of the last 10s some task in the monitor's cgroup stalled (PSI)"),
+    'alert_firing': ('gauge', '', '1 for each alert rule that is currently firing'),
+    'perf_latency': ('histogram', 'seconds', 'Time spent in each collector, serialization and request stage'),
+    'perf_errors': ('counter', '', 'Failed runs of each stage'),
+    'perf_timeouts': ('counter', '', 'Collector runs that overran their timeout'),
+}
+
+def _family_template(family, kind, unit, help_text):
+    name = f"{METRICS_PREFIX}{family}" + (f"_{unit}" if unit else '')
+    header = f"# TYPE {name} {kind}\n" + (f"# UNIT {name} {unit}\n" if unit else '') + f"# HELP {name} {help_text}\n"
+    # OpenMetrics counter samples carry a _total suffix
+    return header, name + ('_total' if kind == 'counter' else '')
+
+METRICS_TEMPLATE = {family: _family_template(family, *spec) for family, spec in METRIC_FAMILIES.items()}
+
+def render_metrics(stats):
+    """Fill the prebuilt OpenMetrics template from a snapshot"""
+    samples = {}
+    for family, labels, value in chain(_metric_samples(stats), _perf_samples()):
+        samples.setdefault(family, []).append(f"{METRICS_TEMPLATE[family][1]}{labels} {float(value)!r}\n")
+    lines = []
+    for family, (header, _) in METRICS_TEMPLATE.items():
+        if family in samples:
+            lines.append(header)
+            lines.extend(samples[family])
+    lines.append('# EOF\n')
+    return ''.join(lines).encode()
+
+class StaticAssets:
+    """The dashboard's files from STATIC_DIR, loaded once on first request
+
+    Every file except index.html is served as /static/<stem>.<hash><ext>
+    with a year-long immutable Cache-Control; index.html's {{ name }}
+    placeholders are replaced with those URLs and it is revalidated by ETag,
+    so a repeat visit costs one 304. gzip and brotli variants are built
+    once per file on first use and selected by Accept-Encoding.
+    """
+
+    PLACEHOLDER = re.compile(r'\{\{\s*([\w.-]+)\s*\}\}')
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._assets = None
+        self._variants = {}
+
+    def _asset(self, body, mimetype, immutable):
+        return {
+            'body': body,
+            'mimetype': mimetype,
+            'etag': hashlib.sha256(body).hexdigest()[:STATIC_HASH_LENGTH],
+            'immutable': immutable
+        }
+
+    def _load(self):
+        assets = {}
+        urls = {}
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name == 'index.html' or not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                body = f.read()
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            asset = self._asset(body, mimetype, True)
+            stem, ext = os.path.splitext(name)
+            urls[name] = f"/static/{stem}.{asset['etag']}{ext}"
+            assets[urls[name]] = asset
+            # The plain name still works (for debugging) but is revalidated
+            assets[f"/static/{name}"] = dict(asset, immutable=False)
+        with open(os.path.join(self.directory, 'index.html'), encoding='utf-8') as f:
+            html = self.PLACEHOLDER.sub(lambda m: urls[m.group(1)], f.read())
+        assets['/'] = self._asset(html.encode(), 'text/html', False)
+        return assets
+
+    def get(self, path):
+        """The asset served at path, or None"""
+        if self._assets is None:
+            with self._lock:
+                if self._assets is None:
+                    self._assets = self._load()
+        return self._assets.get(path)
+
+    def _variant(self, path, asset, encoding):
+        key = (path, encoding)
+        body = self._variants.get(key)
+        if body is None:
+            if encoding == 'br':
+                body = optional_import('brotli').compress(asset['body'], quality=STATIC_BROTLI_QUALITY)
+            else:
+                body = gzip.compress(asset['body'], compresslevel=STATIC_GZIP_LEVEL, mtime=0)
+            self._variants[key] = body
+        return body
+
+    def response(self, path):
+        """Serve path, conditional on If-None-Match; 404 if there is no such asset"""
+        asset = self.get(path)
+        if asset is None:
+            return jsonify({'error': f"No asset {path}"}), 404
+        encoding = choose_encoding(len(asset['body']))
+        if encoding == 'identity':
+            response = Response(asset['body'], mimetype=asset['mimetype'])
+            response.set_etag(asset['etag'])
+        else:
+            response = Response(self._variant(path, asset, encoding), mimetype=asset['mimetype'])
+            response.headers['Content-Encoding'] = encoding
+            # Each encoding is a different representation, so it gets its own tag
+            response.set_etag(f"{asset['etag']}-{encoding}")
+        response.headers['Vary'] = 'Accept-Encoding'
+        if asset['immutable']:
+            response.headers['Cache-Control'] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+        else:
+            response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+
+static_assets = StaticAssets(STATIC_DIR)
+
+@app.before_request
+def track_client_activity():
+    note_client_activity()
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def time_request(response):
+    if not startup_trace.done:
+        startup_trace.first_response(request.path)
+    if request.endpoint is not None and 'request_start' in g:
+        perf.observe(f"request.{request.endpoint}", time.perf_counter() - g.request_start,
+                     response.status_code >= 500)
+    return response
+
+@app.route('/')
+def index():
+    """Serve the dashboard HTML (revalidated by ETag)"""
+    return static_assets.response('/')
+
+@app.route('/static/<path:name>')
+def static_file(name):
+    """Serve a dashboard asset; hashed names are cached for a year"""
+    return static_assets.response(f"/static/{name}")
+
+@app.route('/api/system')
+def api_system():
+    """API endpoint for system information (cached, supports If-None-Match)"""
+    body, etag = system_info_cache.get()
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/stats')
+def api_stats():
+    """API endpoint for all system stats (v1: byte values as formatted strings)"""
+    stats = sampler.snapshot()
+    if stats is None:
+        return jsonify({'error': 'Sampler not ready'}), 503
+    return encoded_response(lambda: encode_json(to_v1(stats)), 'application/json', stats, 'v1')
+
+@app.route('/api/v2/stats')
+def api_v2_stats():
+    """API endpoint for all system stats as raw numbers (see /api/v2/units)"""
+    stats = sampler.snapshot()
+    if stats is None:
+        return jsonify({'error': 'Sampler not ready'}), 503
+    return encoded_response(lambda: encode_json(stats), 'application/json', stats, 'v2')
+
+@app.route('/api/v2/units')
+def api_v2_units():
+    """API endpoint for the units of every numeric /api/v2/stats field"""
+    response = jsonify(UNITS)
+    response.headers['Cache-Control'] = 'max-age=86400'
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus/OpenMetrics exporter rendered from the latest sampler snapshot"""
+    stats = sampler.snapshot()
+    if stats is None:
+        return Response('# sampler not ready\n', status=503, mimetype='text/plain')
+    openmetrics = 'application/openmetrics-text' in request.headers.get('Accept', '')
+    response = encoded_response(lambda: render_metrics(stats), 'text/plain', stats, 'metrics')
+    response.headers['Content-Type'] = OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TEXT_TYPE
+    return response
+
+@app.route('/api/processes')
+def api_processes():
+    """API endpoint for the top processes: ?sort=cpu|memory|pid|threads&limit=25"""
+    sort = request.args.get('sort', 'cpu')
+    if sort not in PROCESS_SORT_KEYS:
+        return jsonify({'error': f"sort must be one of {', '.join(PROCESS_SORT_KEYS)}"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 25)), 1), PROCESS_LIMIT_MAX)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    if isinstance(sampler, SharedSnapshotReader):
+        # The sampler process keeps the table up to date while workers ask for it
+        table = sampler.extra(process_collector.key) or {'rows': [], 'sampled_at': None}
+        rows, sampled_at = table['rows'], table['sampled_at']
+    else:
+        sampler.start()
+        process_collector.request()
+        rows, sampled_at = process_collector.rows, process_collector.sampled_at
+    return jsonify({
+        'processes': process_collector.top(sort, limit, rows),
+        'total': len(rows),
+        'sort': sort,
+        'sampled_at': sampled_at
+    })
+
+@app.route('/api/cgroups')
+def api_cgroups():
+    """API endpoint for per-cgroup usage: ?sort=cpu|memory|throttled|cpu_pressure|memory_pressure|io_pressure&limit=50"""
+    if not cgroup_collector.available():
+        return jsonify({'error': f"No cgroup filesystem at {CGROUP_ROOT} (set SYSMON_CGROUP_ROOT)"}), 404
+    sort = request.args.get('sort', 'cpu')
+    if sort not in CGROUP_SORT_KEYS:
+        return jsonify({'error': f"sort must be one of {', '.join(CGROUP_SORT_KEYS)}"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), CGROUP_LIMIT_MAX)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    if isinstance(sampler, SharedSnapshotReader):
+        # The sampler process keeps the breakdown up to date while workers ask for it
+        table = dict(sampler.extra(cgroup_collector.key) or {
+            'groups': [], 'sampled_at': None, 'version': cgroup_collector.version,
+            'self': cgroup_collector.path, 'scoped': None})
+    else:
+        sampler.start()
+        cgroup_collector.request()
+        table = cgroup_collector.table()
+    groups = table.pop('groups')
+    return jsonify(dict(table, cgroups=cgroup_collector.top(sort, limit, groups), total=len(groups), sort=sort))
+
+@app.route('/api/stream')
+def api_stream():
+    """Server-Sent Events stream: one full v2 snapshot with units, then merge-patch deltas"""
+    sampler.start()
+    if not stream_hub.join():
+        return jsonify({'error': 'Too many open streams, poll /api/v2/stats instead'}), 503
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    response = Response(stream_hub.frames(), mimetype='text/event-stream', headers=headers)
+    # The WSGI server closes the response when the client goes away or the stream ends
+    response.call_on_close(stream_hub.leave)
+    return response
+
+@app.route('/api/history')
+def api_history():
+    """API endpoint for downsampled history: ?metric=cpu.usage&from=&to=&step=&format=&host=
+
+    format is json, msgpack or binary (see encode_history_binary); without it
+    the Accept header decides. On a collector, host selects an agent's history.
+    """
+    store, log = metric_store, metric_log
+    if isinstance(sampler, SharedSnapshotReader):
+        # A worker's in-memory store is a copy taken at fork time; only the log keeps up
+        if log is None:
+            return jsonify({'error': 'History in worker mode needs the on-disk log (SYSMON_DATA_DIR)'}), 409
+        store = None
+    host = request.args.get('host')
+    if host is not None:
+        # Collector: one agent's shard instead of this machine's history
+        if fleet_store is None or host not in fleet_store.shards:
+            return jsonify({'error': f"Unknown host '{host}'"}), 404
+        store, log = fleet_store.shards[host].store, None
+    metric = request.args.get('metric')
+    if not metric:
+        return jsonify({'metrics': (store if store is not None else log).names()})
+    fmt = request.args.get('format')
+    if fmt is None:
+        best = request.accept_mimetypes.best_match(list(HISTORY_FORMATS.values()), 'application/json')
+        fmt = next(name for name, mimetype in HISTORY_FORMATS.items() if mimetype == best)
+    if fmt not in HISTORY_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(HISTORY_FORMATS)}"}), 400
+    if fmt == 'msgpack' and optional_import('msgpack') is None:
+        return jsonify({'error': 'msgpack is not installed (pip install msgpack)'}), 406
+    try:
+        end = float(request.args.get('to') or time.time())
+        start = float(request.args.get('from') or end - HISTORY_CAPACITY * SAMPLE_INTERVAL)
+        step = float(request.args.get('step') or (end - start) / HISTORY_MAX_POINTS)
+    except ValueError:
+        return jsonify({'error': 'from, to and step must be numbers'}), 400
+    if not all(map(math.isfinite, (start, end, step))):
+        return jsonify({'error': 'from, to and step must be finite'}), 400
+    if end < start:
+        return jsonify({'error': 'from must not be after to'}), 400
+    
+    result = store.query(metric, start, end, step) if store is not None else None
+    # Fall back to the on-disk log for ranges older than the in-memory tiers
+    # (e.g. right after a restart)
+    if log is not None and (result is None or not result['t'] or result['t'][0] > start + result['step']):
+        logged = log.query(metric, start, end, step)
+        if logged is not None and (result is None or logged['t']):
+            result = logged
+    if result is None:
+        return jsonify({'error': f"Unknown metric '{metric}'"}), 404
+    result.update({'metric': metric, 'from': start, 'to': end})
+    if fmt == 'binary':
+        return encoded_response(lambda: encode_history_binary(result), HISTORY_FORMATS[fmt])
+    if fmt == 'msgpack':
+        return encoded_response(lambda: encode_history_msgpack(result), HISTORY_FORMATS[fmt])
+    return encoded_response(lambda: encode_json(result), HISTORY_FORMATS[fmt])
+
+@app.route('/api/heatmap')
+def api_heatmap():
+    """API endpoint for per-core / per-sensor heatmap tiles: ?kind=cpu|temp&from=&to=&step=&cols=&format=
+
+    Each tile holds the mean and max of its cells; format is json or binary
+    (see encode_heatmap_binary).
+    """
+    if isinstance(sampler, SharedSnapshotReader):
+        # The matrices live in the sampler process and are too large for the shared block
+        return jsonify({'error': 'Heatmaps are only available in single-process mode (without --workers)'}), 404
+    kind = request.args.get('kind', 'cpu')
+    if kind not in heatmap_store.rings:
+        return jsonify({'error': f"kind must be one of {', '.join(heatmap_store.rings)}"}), 400
+    fmt = request.args.get('format', 'json')
+    if fmt not in HEATMAP_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(HEATMAP_FORMATS)}"}), 400
+    try:
+        end = float(request.args.get('to') or time.time())
+        start = float(request.args.get('from') or end - HEATMAP_CAPACITY * SAMPLE_INTERVAL)
+        step = float(request.args.get('step') or (end - start) / HEATMAP_MAX_ROWS)
+        cols = int(request.args.get('cols') or HEATMAP_MAX_COLS)
+    except ValueError:
+        return jsonify({'error': 'from, to, step and cols must be numbers'}), 400
+    if not all(map(math.isfinite, (start, end, step))):
+        return jsonify({'error': 'from, to and step must be finite'}), 400
+    if end < start:
+        return jsonify({'error': 'from must not be after to'}), 400
+    # Never more than HEATMAP_MAX_ROWS rows or finer than one sample per row; rows
+    # are aligned to multiples of step, so [start, end] can touch one extra row
+    step = max(step, (end - start) / (HEATMAP_MAX_ROWS - 1), SAMPLE_INTERVAL)
+    cols = min(max(cols, 1), HEATMAP_MAX_COLS)
+
+    result = heatmap_store.tiles(kind, start, end, step, cols)
+    if fmt == 'binary':
+        return encoded_response(lambda: encode_heatmap_binary(result), HEATMAP_FORMATS[fmt])
+    return encoded_response(lambda: encode_heatmap_json(result), HEATMAP_FORMATS[fmt])
+
+def _fleet_unavailable():
+    return jsonify({'error': 'This instance is not a collector (start it with --collector)'}), 404
+
+@app.route('/api/ingest', methods=['POST'])
+def api_ingest():
+    """Collector endpoint for agent batches (see encode_ingest_batch)"""
+    if fleet_store is None:
+        return _fleet_unavailable()
+    if INGEST_TOKEN and request.headers.get('Authorization') != f"Bearer {INGEST_TOKEN}":
+        return jsonify({'error': 'Invalid ingest token'}), 401
+    body = request.get_data()
+    try:
+        if request.headers.get('Content-Encoding') == 'gzip':
+            inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            body = inflater.decompress(body, INGEST_MAX_BYTES)
+            if inflater.unconsumed_tail:
+                return jsonify({'error': 'Batch too large'}), 413
+        meta, times, values = decode_ingest_batch(body)
+        with perf.timer('ingest'):
+            stored = fleet_store.ingest(meta, times, values)
+    except (ValueError, KeyError, TypeError, struct.error, zlib.error) as e:
+        return jsonify({'error': f"Bad batch: {e}"}), 400
+    if stored is None:
+        return jsonify({'error': f"Collector already tracks {fleet_store.max_hosts} hosts"}), 403
+    return jsonify({'stored': stored})
+
+@app.route('/api/fleet')
+def api_fleet():
+    """Collector: every host's latest headline values and whether it is reporting"""
+    if fleet_store is None:
+        return _fleet_unavailable()
+    return jsonify({'hosts': fleet_store.overview()})
+
+@app.route('/api/fleet/top')
+def api_fleet_top():
+    """Collector: top-N hosts by a metric's latest value, ?metric=cpu.usage&n=10&order=desc
+
+    metric may be a wildcard pattern, e.g. cpu.core.* for the hottest cores fleet-wide.
+    """
+    if fleet_store is None:
+        return _fleet_unavailable()
+    metric = request.args.get('metric', 'cpu.usage')
+    order = request.args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': 'order must be asc or desc'}), 400
+    try:
+        n = min(max(int(request.args.get('n', 10)), 1), FLEET_TOP_MAX)
+    except ValueError:
+        return jsonify({'error': 'n must be an integer'}), 400
+    include_offline = request.args.get('offline') in ('1', 'true')
+    return jsonify({'metric': metric, 'order': order,
+                    'top': fleet_store.top(metric, n, order == 'desc', not include_offline)})
+
+@app.route('/api/alerts')
+def api_alerts():
+    """Alert rules with their state, plus recent firing/resolved events"""
+    if isinstance(sampler, SharedSnapshotReader):
+        # Rules are evaluated in the sampler process; workers only see what is firing
+        stats = sampler.snapshot()
+        return jsonify({'firing': stats.get('alerts', []) if stats else []})
+    sampler.start()
+    result = alert_engine.to_dict()
+    result['firing'] = [rule for rule in result['rules'] if rule['state'] == 'firing']
+    return jsonify(result)
+
+@app.route('/api/alerts/rules', methods=['POST'])
+def api_alert_rules_add():
+    """Add or replace a rule: POST {"rule": "cpu-high: cpu.usage > 90 for 2m"}"""
+    if isinstance(sampler, SharedSnapshotReader):
+        return jsonify({'error': 'Rules can only be changed in single-process mode or via SYSMON_ALERT_RULES'}), 409
+    if not request.is_json:
+        return jsonify({'error': 'Send the rule as JSON: {"rule": "..."}'}), 415
+    text = (request.get_json(silent=True) or {}).get('rule')
+    if not text:
+        return jsonify({'error': 'rule is required'}), 400
+    try:
+        rule = alert_engine.add(text)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(rule.to_dict()), 201
+
+@app.route('/api/alerts/rules/<path:name>', methods=['DELETE'])
+def api_alert_rules_remove(name):
+    """Remove a rule by name"""
+    if isinstance(sampler, SharedSnapshotReader):
+        return jsonify({'error': 'Rules can only be changed in single-process mode or via SYSMON_ALERT_RULES'}), 409
+    if not alert_engine.remove(name):
+        return jsonify({'error': f"Unknown rule '{name}'"}), 404
+    return '', 204
+
+@app.route('/api/debug/perf')
+def api_debug_perf():
+    """Latency histograms, error counts and the monitor process's own footprint
+
+    Numbers are for the process answering the request; under gunicorn or
+    uvicorn the collectors run in the parent process, not in the workers.
+    """
+    try:
+        with _monitor_process.oneshot():
+            cpu = _monitor_process.cpu_times()
+            process = {
+                'pid': _monitor_process.pid,
+                'cpu_user': cpu.user,
+                'cpu_system': cpu.system,
+                'memory_rss': _monitor_process.memory_info().rss,
+                'threads': _monitor_process.num_threads()
+            }
+    except Exception as e:
+        process = {'error': str(e)}
+    stats = sampler.snapshot(timeout=0)
+    if stats is not None and 'cpu_percent' in stats.get('monitor', {}):
+        process['cpu_percent'] = stats['monitor']['cpu_percent']
+    result = {'process': process, 'stages': perf.to_dict()}
+    if profiler.running or profiler.samples:
+        result['profiler'] = profiler.to_dict()
+    return jsonify(result)
+
+@app.route('/api/debug/profile', methods=['GET', 'POST'])
+def api_debug_profile():
+    """Sampling profiler: POST {"action": "start"|"stop"}, GET the stacks (?format=collapsed for flamegraphs)"""
+    if request.method == 'POST':
+        # JSON only: other origins cannot send it without a preflight, which CORS refuses
+        if not request.is_json:
+            return jsonify({'error': 'Send the action as JSON: {"action": "start"}'}), 415
+        action = (request.get_json(silent=True) or {}).get('action')
+        if action == 'start':
+            profiler.start()
+        elif action == 'stop':
+            profiler.stop()
+        else:
+            return jsonify({'error': 'action must be start or stop'}), 400
+    if request.args.get('format') == 'collapsed':
+        return Response(profiler.collapsed(), mimetype='text/plain')
+    try:
+        limit = max(int(request.args.get('limit', 50)), 1)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify(profiler.to_dict(limit))
+
+def parse_args(argv=None):
+    """Parse the command line options"""
+    parser = argparse.ArgumentParser(description='System Monitor Dashboard')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=5000, help='port to listen on (default: 5000)')
+    parser.add_argument('--server', choices=SERVERS, default='flask',
+                        help='HTTP server: flask (development), waitress, gunicorn or uvicorn')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes for gunicorn/uvicorn')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS,
+                        help=f"request threads per process for waitress/gunicorn (default: {DEFAULT_THREADS}); "
+                             f"/api/stream clients are capped {STREAM_SPARE_THREADS} below this")
+    parser.add_argument('--interval', type=float, default=SAMPLE_INTERVAL,
+                        help=f"seconds between samples (default: {SAMPLE_INTERVAL})")
+    parser.add_argument('--headless', action='store_true', help='do not open a browser window')
+    parser.add_argument('--startup-trace', action='store_true',
+                        help='print how long each startup phase took once the first response is sent')
+    parser.add_argument('--collector', action='store_true',
+                        help='accept samples from agents at /api/ingest and serve /api/fleet')
+    parser.add_argument('--agent', metavar='URL',
+                        help='run headless without a web server, sending samples to the collector at URL')
+    parser.add_argument('--agent-name', help='host name reported by --agent (default: this hostname)')
+    args = parser.parse_args(argv)
+    if args.collector and (args.server == 'uvicorn' or (args.server == 'gunicorn' and args.workers > 1)):
+        parser.error('--collector keeps fleet data in one process: use --server flask/waitress '
+                     'or gunicorn with --workers 1')
+    return args
+
+def share_snapshots():
+    """Publish sampler snapshots to shared memory for worker processes"""
+    global shared_snapshot
+    shared_snapshot = SharedSnapshot()
+    atexit.register(shared_snapshot.close)
+    os.environ[SHARED_SNAPSHOT_ENV] = shared_snapshot.name
+    return shared_snapshot.name
+
+def serve_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+    name = share_snapshots()
+    
+    def post_fork(server, worker):
+        reset_after_fork()
+        attach_shared_snapshot(name)
+    
+    class GunicornApp(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{args.host}:{args.port}")
+            self.cfg.set('workers', args.workers)
+            # Threads so long-lived /api/stream clients don't starve a worker
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', args.threads)
+            self.cfg.set('post_fork', post_fork)
+
+        def load(self):
+            return app
+    
+    GunicornApp().run()
+
+def serve_uvicorn(args):
+    import uvicorn
+    share_snapshots()
+    # Worker processes import the module by name and find the shared snapshot
+    # through SYSMON_SHARED_SNAPSHOT
+    target = f"{__name__ if __name__ != '__main__' else 'app'}:app"
+    os.environ[STREAM_MAX_CLIENTS_ENV] = str(stream_hub.max_clients)
+    uvicorn.run(target, host=args.host, port=args.port, workers=args.workers, interface='wsgi')
+
+def dashboard_url(args):
+    browse_host = 'localhost' if args.host in ('0.0.0.0', '::', '127.0.0.1') else args.host
+    return f"http://{browse_host}:{args.port}"
+
+def open_browser(url, wait_for=None):
+    """Open url from a background thread, first waiting until wait_for=(host, port) accepts connections"""
+    def run():
+        if wait_for is not None:
+            deadline = time.monotonic() + 30
+            while time.monotonic() < deadline:
+                try:
+                    socket.create_connection(wait_for, timeout=0.5).close()
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        import webbrowser
+        webbrowser.open(url)
+        startup_trace.mark('browser opened')
+    
+    threading.Thread(target=run, name='browser', daemon=True).start()
+
+def listening(args):
+    """The socket is bound: warm the collectors and open the browser right away"""
+    startup_trace.mark('listener bound')
+    sampler.start()
+    if not args.headless:
+        open_browser(dashboard_url(args))
+
+def serve(args):
+    """Bind the selected HTTP server, then start the sampler and serve"""
+    global fleet_store
+    sampler.interval = args.interval
+    metric_store.raw_step = args.interval
+    if args.agent:
+        Agent(args.agent, args.agent_name).run()
+        return
+    if args.collector:
+        fleet_store = FleetStore()
+    threads = UVICORN_WSGI_THREADS if args.server == 'uvicorn' else args.threads
+    stream_hub.max_clients = max(threads - STREAM_SPARE_THREADS, 1)
+    if args.server == 'waitress':
+        import waitress
+        server = waitress.create_server(app, host=args.host, port=args.port, threads=args.threads)
+        listening(args)
+        server.run()
+    elif args.server in ('gunicorn', 'uvicorn'):
+        # These bind inside their own run loop: the sampler must start before
+        # workers fork (reset_after_fork clears the locks they inherit), and
+        # the browser waits for the port to accept
+        sampler.start()
+        if not args.headless:
+            open_browser(dashboard_url(args), ('127.0.0.1' if args.host in ('0.0.0.0', '::') else args.host, args.port))
+        if args.server == 'gunicorn':
+            serve_gunicorn(args)
+        else:
+            serve_uvicorn(args)
+    else:
+        from werkzeug.serving import make_server
+        server = make_server(args.host, args.port, app, threaded=True)
+        listening(args)
+        server.serve_forever()
+
+def main(argv=None):
+    startup_trace.mark('module loaded')
+    args = parse_args(argv)
+    startup_trace.enabled = args.startup_trace
+    startup_trace.mark('arguments parsed')
+    if args.agent:
+        print(f"Agent {args.agent_name or socket.gethostname()}: sending samples to {args.agent} "
+              f"every {AGENT_BATCH_SECONDS}s")
+        serve(args)
+        return
+    url = dashboard_url(args)
+    
+    print("=" * 60)
+    print("          SYSTEM MONITOR DASHBOARD v1.3")
+    print("=" * 60)
+    print()
+    print("  ✅ Server running successfully")
+    if args.headless:
+        print(f"  🌐 Dashboard available at {url}")
+    else:
+        print("  🌐 Dashboard opened in your browser")
+    print("  🔄 Monitoring in real-time...")
+    if args.collector:
+        print(f"  🛰️  Collecting from agents at {url}/api/ingest")
+        if not INGEST_TOKEN:
+            print("  ⚠️  SYSMON_INGEST_TOKEN is not set: any client can post samples")
+    print()
+    print("  ⚠️  DO NOT CLOSE THIS WINDOW")
     print("      (Closing stops the monitoring)")
     print()
     print("=" * 60)
     
-    app.run(debug=False, host='127.0.0.1', port=5000, use_reloader=False)
+    serve(args)
+
+if __name__ == '__main__':
+    main()
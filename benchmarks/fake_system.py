@@ -0,0 +1,166 @@
+"""
+Deterministic stand-in for psutil, so benchmarks give comparable numbers on
+any Linux box (CI runners included) whatever its disks, NICs and processes.
+
+Every value is derived from a per-function call counter, so two runs see
+the same sequence of readings. GPUs come from app's FakeGpuBackend
+(SYSMON_GPU_BACKEND=fake), which is deterministic in the same way.
+make_cgroupfs() writes a cgroup v2 tree for SYSMON_CGROUP_ROOT.
+"""
+
+import os
+from collections import namedtuple
+
+svmem = namedtuple('svmem', 'total available percent used free')
+sswap = namedtuple('sswap', 'total used free percent sin sout')
+scpufreq = namedtuple('scpufreq', 'current min max')
+sdiskpart = namedtuple('sdiskpart', 'device mountpoint fstype opts')
+sdiskusage = namedtuple('sdiskusage', 'total used free percent')
+sdiskio = namedtuple('sdiskio', 'read_count write_count read_bytes write_bytes read_time write_time')
+snetio = namedtuple('snetio', 'bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout')
+shwtemp = namedtuple('shwtemp', 'label current high critical')
+pmem = namedtuple('pmem', 'rss vms')
+
+GiB = 1024 ** 3
+
+class Error(Exception):
+    pass
+
+class NoSuchProcess(Error):
+    pass
+
+class FakeProcess:
+    """The slice of psutil.Process that ProcessCollector uses"""
+
+    def __init__(self, system, pid, info):
+        self._system = system
+        self.pid = pid
+        self.info = info
+
+    def __eq__(self, other):
+        return isinstance(other, FakeProcess) and other.pid == self.pid
+
+    def __hash__(self):
+        return self.pid
+
+    def cpu_percent(self, interval=None):
+        return (self.pid * 7 + self._system.calls['process_iter']) % 100 / 4
+
+class FakePsutil:
+    """Synthetic host: `cores` CPUs, `disks` mounts, `nics` interfaces, `processes` processes"""
+
+    Error = Error
+    NoSuchProcess = NoSuchProcess
+
+    def __init__(self, cores=8, disks=4, nics=3, processes=300, sensors=6):
+        self.cores = cores
+        self.disks = disks
+        self.nics = nics
+        self.processes = processes
+        self.sensors = sensors
+        self.calls = dict.fromkeys(['cpu_percent', 'virtual_memory', 'disk_io_counters',
+                                    'net_io_counters', 'sensors_temperatures', 'process_iter'], 0)
+
+    def _tick(self, name):
+        self.calls[name] += 1
+        return self.calls[name]
+
+    def cpu_count(self, logical=True):
+        return self.cores if logical else self.cores // 2
+
+    def boot_time(self):
+        return 1700000000.0
+
+    def cpu_percent(self, interval=None, percpu=False):
+        n = self._tick('cpu_percent')
+        if percpu:
+            return [float((n * 3 + core * 11) % 100) for core in range(self.cores)]
+        return float(n * 3 % 100)
+
+    def cpu_freq(self):
+        return scpufreq(2400.0, 800.0, 3600.0)
+
+    def virtual_memory(self):
+        n = self._tick('virtual_memory')
+        total = 32 * GiB
+        used = total // 4 + n % 64 * 64 * 1024 ** 2
+        return svmem(total, total - used, used / total * 100, used, total - used)
+
+    def swap_memory(self):
+        return sswap(8 * GiB, GiB, 7 * GiB, 12.5, 0, 0)
+
+    def disk_partitions(self, all=False):
+        return [sdiskpart(f"/dev/sd{chr(97 + i)}1", '/' if i == 0 else f"/mnt/data{i}", 'ext4', 'rw')
+                for i in range(self.disks)]
+
+    def disk_usage(self, path):
+        total = 500 * GiB
+        used = (len(path) * 37 % 90 + 5) * total // 100
+        return sdiskusage(total, used, total - used, used / total * 100)
+
+    def disk_io_counters(self, perdisk=False):
+        n = self._tick('disk_io_counters')
+        counters = {f"sd{chr(97 + i)}": sdiskio(n * 10, n * 20, n * 4096 * (i + 1), n * 8192 * (i + 1), n, n)
+                    for i in range(self.disks)}
+        return counters if perdisk else next(iter(counters.values()))
+
+    def net_io_counters(self, pernic=False):
+        n = self._tick('net_io_counters')
+        counters = {f"eth{i}": snetio(n * 1500 * (i + 1), n * 3000 * (i + 1), n * 10, n * 20, 0, 0, 0, 0)
+                    for i in range(self.nics)}
+        return counters if pernic else next(iter(counters.values()))
+
+    def sensors_temperatures(self):
+        n = self._tick('sensors_temperatures')
+        return {'coretemp': [shwtemp(f"Core {i}", 40.0 + (n + i) % 30, 80.0, 100.0)
+                             for i in range(self.sensors)]}
+
+    def process_iter(self, attrs=None, ad_value=None):
+        n = self._tick('process_iter')
+        for pid in range(1, self.processes + 1):
+            info = {
+                'name': f"proc{pid}",
+                'username': 'root' if pid % 5 == 0 else 'user',
+                'cpu_percent': (pid * 13 + n) % 100 / 4,
+                'memory_info': pmem(pid * 4 * 1024 ** 2, pid * 16 * 1024 ** 2),
+                'num_threads': pid % 16 + 1,
+                'status': 'running' if pid % 7 == 0 else 'sleeping'
+            }
+            yield FakeProcess(self, pid, info)
+
+def install(app, **sizes):
+    """Point app's psutil at a FakePsutil and return it"""
+    fake = FakePsutil(**sizes)
+    app.psutil = fake
+    return fake
+
+def write_cgroup(directory, n=1, cpu_max='max', memory_max='max'):
+    """Write (or advance to reading n) the v2 control files of one cgroup"""
+    os.makedirs(directory, exist_ok=True)
+    files = {
+        'cpu.stat': f"usage_usec {n * 250000}\nuser_usec {n * 200000}\nsystem_usec {n * 50000}\n"
+                    f"nr_periods {n * 10}\nnr_throttled {n * 2}\nthrottled_usec {n * 40000}\n",
+        'cpu.max': f"{cpu_max} 100000\n",
+        'memory.current': f"{GiB // 4 + n * 4096}\n",
+        'memory.max': f"{memory_max}\n",
+        'io.stat': f"8:0 rbytes={n * 8192} wbytes={n * 4096} rios={n} wios={n} dbytes=0 dios=0\n",
+    }
+    for resource, stall in (('cpu', 1.5), ('memory', 0.25), ('io', 3.0)):
+        files[f"{resource}.pressure"] = (f"some avg10={stall:.2f} avg60={stall:.2f} avg300={stall:.2f} total={n * 1000}\n"
+                                         f"full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n")
+    for name, text in files.items():
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(text)
+
+def make_cgroupfs(root, groups=8, n=1):
+    """A cgroup v2 tree at root: the root (a 2 CPU / 1 GiB container) and
+    `groups` services under system.slice; returns the service directories"""
+    write_cgroup(root, n, cpu_max=200000, memory_max=GiB)
+    with open(os.path.join(root, 'cgroup.controllers'), 'w') as f:
+        f.write('cpu io memory pids\n')
+    services = []
+    for i in range(groups):
+        directory = os.path.join(root, 'system.slice', f"service{i}.service")
+        write_cgroup(directory, n * (i + 1), cpu_max=50000 * (i + 1))
+        services.append(directory)
+    return services
@@ -0,0 +1,306 @@
+"""
+Benchmarks for app.py's hot paths, run against a deterministic fake host
+
+Run:     python benchmarks/run.py
+Save:    python benchmarks/run.py --save benchmarks/baseline.json
+Compare: python benchmarks/run.py --compare benchmarks/baseline.json
+         (exits with status 1 if a p50, allocation or concurrent
+         throughput figure is worse than --threshold, default 25%)
+
+Each benchmark reports p50/p99 latency and calls per second when run
+alone, peak bytes allocated per call (tracemalloc), and for HTTP endpoints
+the throughput and p99 with --clients concurrent test clients. Baselines
+are per machine: compare against one saved on the same box.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+# Configure app before it is imported: no disk log, fake GPUs
+os.environ['SYSMON_DATA_DIR'] = ''
+os.environ['SYSMON_GPU_BACKEND'] = 'fake'
+os.environ.setdefault('SYSMON_FAKE_GPUS', '2')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+import fake_system
+
+# Ratio of new to baseline value above which a metric counts as a regression
+DEFAULT_THRESHOLD = 0.25
+# Baselines stay comparable only with the same fake host size
+HOST_SIZE = {'cores': 8, 'disks': 4, 'nics': 3, 'processes': 300, 'sensors': 6}
+# Services in the fake cgroup tree read by the cgroup benchmarks
+CGROUP_SERVICES = 32
+HISTORY_POINTS = 3600
+# Benchmarks that query history get HISTORY_POINTS seconds of it first;
+# every other benchmark starts from an empty store
+HISTORY_BENCHMARKS = {'history_query', 'api_history_json', 'api_history_binary', 'api_history_msgpack'}
+# Only these metrics count toward a regression; p99 and single-client
+# throughput are shown but are too noisy on shared CI machines
+GATED = {'p50_us': True, 'alloc_bytes': True, 'concurrent_ops_per_sec': False}
+
+def percentile(sorted_values, q):
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+def measure(func, iterations, warmup):
+    """Time func() `iterations` times; return latency percentiles in microseconds"""
+    for _ in range(warmup):
+        func()
+    timings = []
+    # As timeit does: a collection landing in one run would swamp its p99
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter_ns()
+            func()
+            timings.append(time.perf_counter_ns() - t0)
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.enable()
+    timings.sort()
+    return {
+        'p50_us': percentile(timings, 0.5) / 1000,
+        'p99_us': percentile(timings, 0.99) / 1000,
+        'ops_per_sec': iterations / elapsed
+    }
+
+def measure_allocations(func, iterations):
+    """Median peak bytes allocated during one call"""
+    func()
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(iterations):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    peaks.sort()
+    return percentile(peaks, 0.5)
+
+def measure_concurrent(make_call, clients, duration):
+    """Run `clients` threads, each with its own call, for `duration` seconds"""
+    timings = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def client():
+        call = make_call()
+        local = []
+        while not stop.is_set():
+            t0 = time.perf_counter_ns()
+            call()
+            local.append(time.perf_counter_ns() - t0)
+        with lock:
+            timings.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    return {
+        'concurrent_ops_per_sec': len(timings) / elapsed,
+        'concurrent_p99_us': percentile(timings, 0.99) / 1000 if timings else None
+    }
+
+def get(path, headers=None):
+    """Return a factory for a call that GETs path with a fresh test client"""
+    def make_call():
+        client = app.app.test_client()
+
+        def call():
+            response = client.get(path, headers=headers)
+            assert response.status_code in (200, 304), (path, response.status_code)
+            response.get_data()
+        return call
+    return make_call
+
+def fill_history(metrics, end):
+    """Record HISTORY_POINTS seconds of samples ending at `end` into app's store"""
+    for i in range(HISTORY_POINTS):
+        app.metric_store.record(end - HISTORY_POINTS + i, metrics)
+
+def benchmarks(snapshot, metrics, end, cgroup_root):
+    """name -> (call factory, is an HTTP endpoint)"""
+    app.sampler._snapshot = snapshot
+    app.sampler._ready.set()
+    _, etag = app.system_info_cache.get()
+    index_etag = app.static_assets.get('/')['etag']
+    history = f"/api/history?metric=cpu.usage&from={end - HISTORY_POINTS}&to={end}"
+
+    def fresh_snapshot():
+        # A new snapshot object misses the response cache, as after every sample
+        app.sampler._snapshot = dict(snapshot)
+
+    def uncached(path, headers=None):
+        def make_call():
+            call = get(path, headers)()
+
+            def run():
+                fresh_snapshot()
+                call()
+            return run
+        return make_call
+
+    def direct(func, *args):
+        return (lambda: lambda: func(*args)), False
+
+    now = [end]
+
+    def record():
+        now[0] += 1
+        app.metric_store.record(now[0], metrics)
+
+    result = {
+        'get_cpu_info': direct(app.get_cpu_info),
+        'get_memory_info': direct(app.get_memory_info),
+        'get_disk_info': direct(app.get_disk_info),
+        'get_disk_io_info': direct(app.get_disk_io_info),
+        'get_network_info': direct(app.get_network_info),
+        'get_gpu_info': direct(app.get_gpu_info),
+        'get_temperature_info': direct(app.get_temperature_info),
+        'get_system_info': direct(app.get_system_info),
+        'process_sample': direct(app.process_collector.sample),
+        'collect_stats': direct(app.collect_stats),
+        'flatten_stats': direct(app.flatten_stats, snapshot),
+        'to_v1': direct(app.to_v1, snapshot),
+        'encode_json_v2': direct(app.encode_json, snapshot),
+        'render_metrics': direct(app.render_metrics, snapshot),
+        'history_record': ((lambda: record), False),
+        # app.metric_store is replaced per benchmark, so look it up at call time
+        'history_query': ((lambda: lambda: app.metric_store.query('cpu.usage', end - HISTORY_POINTS, end, 10)), False),
+        'index_304': (get('/', {'If-None-Match': f'"{index_etag}"'}), True),
+        'api_stats': (get('/api/stats'), True),
+        'api_stats_uncached': (uncached('/api/stats'), True),
+        'api_v2_stats_gzip_uncached': (uncached('/api/v2/stats', {'Accept-Encoding': 'gzip'}), True),
+        'api_system': (get('/api/system'), True),
+        'api_system_304': (get('/api/system', {'If-None-Match': f'"{etag}"'}), True),
+        'metrics_uncached': (uncached('/metrics'), True),
+        'api_history_json': (get(history), True),
+        'api_history_binary': (get(history + '&format=binary'), True),
+    }
+    cgroups = app.CgroupCollector(cgroup_root)
+    result['cgroup_own'] = direct(cgroups.own)
+    result['cgroup_tree'] = direct(cgroups.sample)
+    if app.optional_import('msgpack') is not None:
+        result['api_history_msgpack'] = (get(history + '&format=msgpack'), True)
+    return result
+
+def run(args):
+    snapshot = app.collect_stats()
+    metrics = app.flatten_stats(snapshot)
+    end = time.time()
+    results = {}
+    # Cgroup benchmarks read a fake v2 tree (see fake_system.make_cgroupfs)
+    cgroup_root = tempfile.mkdtemp(prefix='sysmon-cgroupfs-')
+    fake_system.make_cgroupfs(cgroup_root, CGROUP_SERVICES)
+    try:
+        for name, (make_call, http) in benchmarks(snapshot, metrics, end, cgroup_root).items():
+            if args.filter and args.filter not in name:
+                continue
+            app.metric_store = app.TimeSeriesStore()
+            if name in HISTORY_BENCHMARKS:
+                fill_history(metrics, end)
+            call = make_call()
+            result = measure(call, args.iterations, args.warmup)
+            result['alloc_bytes'] = measure_allocations(call, min(args.iterations, 200))
+            if http and args.clients > 1:
+                result.update(measure_concurrent(make_call, args.clients, args.duration))
+            results[name] = result
+            line = f"{name:28} p50 {result['p50_us']:10.1f}us  p99 {result['p99_us']:10.1f}us  " \
+                   f"{result['ops_per_sec']:10.0f}/s  alloc {result['alloc_bytes']:9d}B"
+            if 'concurrent_ops_per_sec' in result:
+                line += f"  x{args.clients}: {result['concurrent_ops_per_sec']:8.0f}/s"
+            print(line)
+    finally:
+        shutil.rmtree(cgroup_root, ignore_errors=True)
+    return results
+
+def compare(results, baseline, threshold):
+    """Print changes against a baseline; return the names that regressed"""
+    regressed = []
+    print()
+    print(f"Compared with baseline from {baseline['meta'].get('created', '?')}:")
+    for name, result in results.items():
+        old = baseline['results'].get(name)
+        if old is None:
+            print(f"  {name:28} new")
+            continue
+        changes = []
+        for key in ('p50_us', 'p99_us', 'ops_per_sec', 'alloc_bytes', 'concurrent_ops_per_sec'):
+            if not old.get(key) or result.get(key) is None:
+                continue
+            ratio = result[key] / old[key]
+            worse = False
+            if key in GATED:
+                worse = ratio > 1 + threshold if GATED[key] else ratio < 1 / (1 + threshold)
+            changes.append(f"{key} {ratio:5.2f}x{' REGRESSION' if worse else ''}")
+            if worse and name not in regressed:
+                regressed.append(name)
+        print(f"  {name:28} " + ', '.join(changes))
+    return regressed
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark app.py hot paths on a fake host')
+    parser.add_argument('-k', dest='filter', help='only run benchmarks whose name contains this')
+    parser.add_argument('--iterations', type=int, default=1000, help='timed calls per benchmark')
+    parser.add_argument('--warmup', type=int, default=50, help='untimed calls first')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients for HTTP endpoints')
+    parser.add_argument('--duration', type=float, default=1.0, help='seconds per concurrent run')
+    parser.add_argument('--save', metavar='PATH', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare with a saved JSON baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f"allowed slowdown before flagging a regression (default: {DEFAULT_THRESHOLD})")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    fake_system.install(app, **HOST_SIZE)
+    results = run(args)
+
+    if args.save:
+        document = {
+            'meta': {
+                'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'host_size': HOST_SIZE,
+                'iterations': args.iterations,
+                'clients': args.clients
+            },
+            'results': results
+        }
+        with open(args.save, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressed = compare(results, baseline, args.threshold)
+        if regressed:
+            print(f"\nRegressed: {', '.join(regressed)}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
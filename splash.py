@@ -1,9 +1,10 @@
-import tkinter as tk
-from PIL import Image, ImageTk
 import threading
 import time
 
 def show_splash():
+    # Imported here so loading this module costs nothing until a splash is shown
+    import tkinter as tk
+
     splash = tk.Tk()
     splash.overrideredirect(True)
     splash.geometry("400x300")
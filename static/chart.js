@@ -0,0 +1,238 @@
+// Dependency-free charting for the dashboard: typed-array rings drawn on a canvas
+
+// Fixed-size ring of (time, value) pairs in typed arrays: no per-sample allocation
+class RingSeries {
+    constructor(capacity) {
+        this.capacity = capacity;
+        this.t = new Float64Array(capacity);
+        this.v = new Float32Array(capacity);
+        this.head = 0;
+        this.length = 0;
+    }
+
+    push(t, v) {
+        this.t[this.head] = t;
+        this.v[this.head] = v;
+        this.head = (this.head + 1) % this.capacity;
+        if (this.length < this.capacity) {
+            this.length++;
+        }
+    }
+
+    // Physical index of the i-th oldest sample
+    index(i) {
+        return (this.head - this.length + i + this.capacity) % this.capacity;
+    }
+}
+
+// Match a canvas's backing store to its CSS size; returns the pixel ratio
+function fitCanvas(canvas) {
+    const ratio = window.devicePixelRatio || 1;
+    const width = Math.round(canvas.clientWidth * ratio);
+    const height = Math.round(canvas.clientHeight * ratio);
+    if (canvas.width !== width || canvas.height !== height) {
+        canvas.width = width;
+        canvas.height = height;
+    }
+    return ratio;
+}
+
+// Canvas line chart drawn straight from a RingSeries. When there are
+// more samples than pixel columns, each column draws the min and max
+// of its samples (min/max decimation), so spikes are never dropped.
+class LineChart {
+    constructor(canvas, series, color, fillColor, max) {
+        this.canvas = canvas;
+        this.ctx = canvas.getContext('2d');
+        this.series = series;
+        this.color = color;
+        this.fillColor = fillColor;
+        this.max = max;
+    }
+
+    resize() {
+        return fitCanvas(this.canvas);
+    }
+
+    draw(now) {
+        const ratio = this.resize();
+        const ctx = this.ctx;
+        const width = this.canvas.width;
+        const height = this.canvas.height;
+        const pad = 30 * ratio;
+        const plotWidth = width - pad;
+        ctx.clearRect(0, 0, width, height);
+
+        ctx.font = `${11 * ratio}px sans-serif`;
+        ctx.fillStyle = '#999';
+        ctx.strokeStyle = '#eee';
+        ctx.lineWidth = 1;
+        for (let tick = 0; tick <= this.max; tick += this.max / 4) {
+            const y = height - 1 - tick / this.max * (height - 2);
+            ctx.beginPath();
+            ctx.moveTo(pad, y);
+            ctx.lineTo(width, y);
+            ctx.stroke();
+            ctx.fillText(tick, 0, Math.max(y, 11 * ratio));
+        }
+
+        const series = this.series;
+        if (series.length < 2) {
+            return;
+        }
+        const start = now - CHART_WINDOW;
+        const xOf = t => pad + (t - start) / CHART_WINDOW * plotWidth;
+        const yOf = v => height - 1 - Math.min(v, this.max) / this.max * (height - 2);
+
+        ctx.beginPath();
+        let column = -1, low = 0, high = 0, firstX = null, lastX = 0;
+        for (let i = 0; i < series.length; i++) {
+            const k = series.index(i);
+            if (series.t[k] < start) {
+                continue;
+            }
+            const x = Math.floor(xOf(series.t[k]));
+            const y = yOf(series.v[k]);
+            if (x !== column) {
+                if (column >= 0) {
+                    ctx.lineTo(column, low);
+                    ctx.lineTo(column, high);
+                } else {
+                    ctx.moveTo(x, y);
+                    firstX = x;
+                }
+                column = x;
+                low = high = y;
+            } else {
+                low = Math.max(low, y);
+                high = Math.min(high, y);
+            }
+            lastX = x;
+        }
+        if (firstX === null) {
+            return;
+        }
+        ctx.lineTo(column, low);
+        ctx.lineTo(column, high);
+        ctx.strokeStyle = this.color;
+        ctx.lineWidth = 2 * ratio;
+        ctx.stroke();
+        ctx.lineTo(lastX, height);
+        ctx.lineTo(firstX, height);
+        ctx.closePath();
+        ctx.fillStyle = this.fillColor;
+        ctx.fill();
+    }
+}
+
+// 256-entry RGBA ramp from cool (low) to hot (high)
+const HEAT_COLORS = (() => {
+    const stops = [[49, 54, 149], [69, 117, 180], [116, 173, 209], [254, 224, 144],
+                   [253, 174, 97], [244, 109, 67], [215, 48, 39]];
+    const colors = new Uint8ClampedArray(256 * 4);
+    for (let i = 0; i < 256; i++) {
+        const position = i / 255 * (stops.length - 1);
+        const k = Math.min(Math.floor(position), stops.length - 2);
+        const f = position - k;
+        for (let c = 0; c < 3; c++) {
+            colors[i * 4 + c] = stops[k][c] + (stops[k + 1][c] - stops[k][c]) * f;
+        }
+        colors[i * 4 + 3] = 255;
+    }
+    return colors;
+})();
+
+// Heatmap of /api/heatmap tiles: time runs left to right, one band per core
+// or sensor. Each tile is one pixel of an offscreen ImageData that is then
+// scaled onto the canvas, so 256 cores cost no more DOM than one.
+class Heatmap {
+    constructor(canvas, window) {
+        this.canvas = canvas;
+        this.ctx = canvas.getContext('2d');
+        this.window = window;
+        this.tiles = null;
+        this.image = document.createElement('canvas');
+        this.imageCtx = this.image.getContext('2d');
+        this.pixels = null;
+    }
+
+    // Parse a format=binary body (see encode_heatmap_binary in app.py)
+    static parse(buffer) {
+        const view = new DataView(buffer);
+        const rows = view.getUint32(8, true);
+        const cols = view.getUint32(12, true);
+        const step = view.getFloat64(16, true);
+        const cells = rows * cols;
+        let offset = 24;
+        const t = new Float64Array(buffer, offset, rows);
+        offset += 8 * rows;
+        const mean = new Float32Array(buffer, offset, cells);
+        offset += 4 * cells;
+        const max = new Float32Array(buffer, offset, cells);
+        offset += 4 * cells;
+        const labels = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, offset)));
+        return {rows, cols, step, t, mean, max, labels};
+    }
+
+    // Range of the non-empty cells of one field, or null when there are none
+    static range(values) {
+        let low = Infinity, high = -Infinity;
+        for (let i = 0; i < values.length; i++) {
+            const v = values[i];
+            if (v < low) {
+                low = v;
+            }
+            if (v > high) {
+                high = v;
+            }
+        }
+        return low <= high ? [low, high] : null;
+    }
+
+    // Paint field ('mean' or 'max') with low..high mapped onto HEAT_COLORS.
+    // The newest tile sits at the right edge; missing tiles stay blank.
+    draw(field, low, high) {
+        fitCanvas(this.canvas);
+        const ctx = this.ctx;
+        const width = this.canvas.width;
+        const height = this.canvas.height;
+        ctx.clearRect(0, 0, width, height);
+        const tiles = this.tiles;
+        if (!tiles || !tiles.rows) {
+            return;
+        }
+        const {rows, cols, step, t} = tiles;
+        const values = tiles[field];
+        const columns = Math.max(Math.ceil(this.window / step), 1);
+        if (!this.pixels || this.pixels.width !== columns || this.pixels.height !== cols) {
+            this.image.width = columns;
+            this.image.height = cols;
+            this.pixels = this.imageCtx.createImageData(columns, cols);
+        }
+        const data = this.pixels.data;
+        data.fill(0);
+        const scale = high > low ? 255 / (high - low) : 0;
+        const newest = t[rows - 1];
+        for (let r = 0; r < rows; r++) {
+            const x = columns - 1 - Math.round((newest - t[r]) / step);
+            if (x < 0) {
+                continue;
+            }
+            for (let c = 0; c < cols; c++) {
+                const v = values[r * cols + c];
+                if (v !== v) {
+                    continue;
+                }
+                const color = Math.max(0, Math.min(255, Math.round((v - low) * scale))) * 4;
+                const p = (c * columns + x) * 4;
+                data[p] = HEAT_COLORS[color];
+                data[p + 1] = HEAT_COLORS[color + 1];
+                data[p + 2] = HEAT_COLORS[color + 2];
+                data[p + 3] = 255;
+            }
+        }
+        this.imageCtx.putImageData(this.pixels, 0, 0);
+        ctx.imageSmoothingEnabled = false;
+        ctx.drawImage(this.image, 0, 0, columns, cols, 0, 0, width, height);
+    }
+}
@@ -0,0 +1,357 @@
+// Seconds of history shown in the charts, one sample per second
+const CHART_WINDOW = 600;
+
+const cpuSeries = new RingSeries(CHART_WINDOW);
+const ramSeries = new RingSeries(CHART_WINDOW);
+const cpuChart = new LineChart(document.getElementById('cpu-chart'), cpuSeries,
+                               '#667eea', 'rgba(102, 126, 234, 0.1)', 100);
+const ramChart = new LineChart(document.getElementById('ram-chart'), ramSeries,
+                               '#764ba2', 'rgba(118, 75, 162, 0.1)', 100);
+
+function formatBytes(bytes) {
+    const units = ['B', 'KB', 'MB', 'GB', 'TB', 'PB'];
+    let i = 0;
+    while (bytes >= 1024 && i < units.length - 1) {
+        bytes /= 1024;
+        i++;
+    }
+    return bytes.toFixed(2) + units[i];
+}
+
+// DOM writes only when a value actually changed
+function setText(element, text) {
+    if (element._text !== text) {
+        element._text = text;
+        element.textContent = text;
+    }
+}
+
+function setTextById(id, text) {
+    setText(document.getElementById(id), text);
+}
+
+function el(tag, className, parent) {
+    const element = document.createElement(tag);
+    if (className) {
+        element.className = className;
+    }
+    if (parent) {
+        parent.appendChild(element);
+    }
+    return element;
+}
+
+function setProgress(element, value) {
+    const text = value + '%';
+    if (element._text !== text) {
+        element.style.width = text;
+        setText(element, text);
+        const level = value > 80 ? 'progress-fill critical' : value > 60 ? 'progress-fill warning' : 'progress-fill';
+        if (element.className !== level) {
+            element.className = level;
+        }
+    }
+}
+
+function updateProgress(elementId, value) {
+    setProgress(document.getElementById(elementId), value);
+}
+
+// Keep one child per key in container: build() runs once per new key,
+// update() on every render, and children whose key vanished are removed
+function syncList(container, items, keyOf, build, update) {
+    const entries = container._entries || (container._entries = new Map());
+    const seen = new Set();
+    items.forEach((item, index) => {
+        const key = keyOf(item, index);
+        seen.add(key);
+        let entry = entries.get(key);
+        if (!entry) {
+            entry = build(item, index);
+            entries.set(key, entry);
+            container.appendChild(entry.root);
+        }
+        update(entry, item, index);
+    });
+    for (const [key, entry] of entries) {
+        if (!seen.has(key)) {
+            entry.root.remove();
+            entries.delete(key);
+        }
+    }
+}
+
+function buildCore(core, index) {
+    const root = el('div', 'core-item');
+    setText(el('div', 'core-label', root), `Core ${index}`);
+    return {root, value: el('div', 'core-value', root)};
+}
+
+function updateCore(entry, core) {
+    setText(entry.value, core.toFixed(0) + '%');
+}
+
+function buildGpu(gpu) {
+    const root = el('div', 'gpu-item');
+    setText(el('div', 'item-title', root), gpu.name);
+    return {root, load: el('div', 'item-line', root), memory: el('div', 'item-line', root)};
+}
+
+function updateGpu(entry, gpu) {
+    setText(entry.load, `Load: ${gpu.load.toFixed(1)}% | Temp: ${gpu.temp.toFixed(1)}°C`);
+    setText(entry.memory, `Memory: ${gpu.memory_used.toFixed(0)}MB / ${gpu.memory_total.toFixed(0)}MB (${gpu.memory_percent.toFixed(1)}%)`);
+}
+
+function buildDisk(disk) {
+    const root = el('div', 'disk-item');
+    const title = el('div', 'item-title', root);
+    const bar = el('div', 'progress-bar', root);
+    return {root, title, fill: el('div', 'progress-fill', bar), detail: el('div', 'item-detail', root)};
+}
+
+function updateDisk(entry, disk) {
+    setText(entry.title, `${disk.device} - ${disk.mountpoint}${disk.stale ? ' (not responding)' : ''}`);
+    setProgress(entry.fill, disk.percent);
+    setText(entry.detail, `Used: ${formatBytes(disk.used)} / Total: ${formatBytes(disk.total)} (Free: ${formatBytes(disk.free)})`);
+}
+
+function render(data) {
+    try {
+        setTextById('timestamp', data.timestamp);
+        if (data.monitor && data.monitor.memory_rss !== undefined) {
+            setTextById('monitor-footprint',
+                ` · monitor: ${data.monitor.cpu_percent.toFixed(1)}% CPU, ${formatBytes(data.monitor.memory_rss)}`);
+        }
+
+        const alerts = document.getElementById('alerts');
+        alerts.style.display = data.alerts ? 'block' : 'none';
+        setText(alerts, (data.alerts || []).map(alert =>
+            `⚠ ${alert.name}: ${alert.metric} = ${alert.value.toFixed(1)}`).join('  ·  '));
+
+        // In cgroup mode (SYSMON_CGROUP_MODE) cpu and memory are the container's, not the host's
+        setTextById('cpu-scope', data.cpu.scope === 'cgroup' ? '(container)' : '');
+        setTextById('memory-scope', data.memory.scope === 'cgroup' ? '(container)' : '');
+
+        const cpuUsage = data.cpu.usage.toFixed(1);
+        setTextById('cpu-usage', cpuUsage + '%');
+        updateProgress('cpu-progress', cpuUsage);
+        setTextById('cpu-freq', data.cpu.freq_current.toFixed(0) + ' MHz');
+        syncList(document.getElementById('core-grid'), data.cpu.per_core,
+                 (core, index) => index, buildCore, updateCore);
+
+        const ramUsage = data.memory.percent.toFixed(1);
+        setTextById('ram-usage', ramUsage + '%');
+        updateProgress('ram-progress', ramUsage);
+        setTextById('ram-used', formatBytes(data.memory.used));
+        setTextById('ram-total', formatBytes(data.memory.total));
+
+        setTextById('net-sent', formatBytes(data.network.bytes_sent));
+        setTextById('net-recv', formatBytes(data.network.bytes_recv));
+        setTextById('net-up', formatBytes(data.network.bytes_sent_per_sec) + '/s');
+        setTextById('net-down', formatBytes(data.network.bytes_recv_per_sec) + '/s');
+
+        if (data.gpu && data.gpu.length > 0) {
+            document.getElementById('gpu-card').style.display = 'block';
+            syncList(document.getElementById('gpu-list'), data.gpu, gpu => gpu.id, buildGpu, updateGpu);
+        }
+
+        syncList(document.getElementById('disk-list'), data.disk || [], disk => disk.mountpoint,
+                 buildDisk, updateDisk);
+
+        const now = Date.now() / 1000;
+        cpuChart.draw(now);
+        ramChart.draw(now);
+
+    } catch (error) {
+        console.error('Error rendering stats:', error);
+    }
+}
+
+// Snapshots always go into the chart rings; rendering is coalesced to
+// one per animation frame and skipped entirely while the tab is hidden
+let latest = null;
+let frameRequested = false;
+
+function scheduleRender() {
+    if (latest === null || frameRequested || document.hidden) {
+        return;
+    }
+    frameRequested = true;
+    requestAnimationFrame(() => {
+        frameRequested = false;
+        render(latest);
+    });
+}
+
+function receive(data) {
+    latest = data;
+    const now = Date.now() / 1000;
+    if (data.cpu && data.cpu.usage !== undefined) {
+        cpuSeries.push(now, data.cpu.usage);
+    }
+    if (data.memory && data.memory.percent !== undefined) {
+        ramSeries.push(now, data.memory.percent);
+    }
+    scheduleRender();
+}
+
+function buildHost() {
+    const root = el('tr');
+    const cells = [];
+    for (let i = 0; i < 6; i++) {
+        cells.push(el('td', '', root));
+    }
+    return {root, cells};
+}
+
+function percent(value) {
+    return value === null || value === undefined ? '--' : value.toFixed(1) + '%';
+}
+
+function updateHost(entry, host) {
+    const className = host.online ? '' : 'offline';
+    if (entry.root.className !== className) {
+        entry.root.className = className;
+    }
+    const values = [host.host, percent(host.cpu), percent(host.memory), percent(host.disk_max),
+                    formatBytes(host.network_up || 0) + '/s', formatBytes(host.network_down || 0) + '/s'];
+    values.forEach((value, i) => setText(entry.cells[i], value));
+}
+
+// Only a collector (--collector) answers /api/fleet; elsewhere the card stays hidden
+async function fetchFleet() {
+    if (document.hidden) {
+        return true;
+    }
+    const response = await fetch('/api/fleet');
+    if (!response.ok) {
+        return false;
+    }
+    const data = await response.json();
+    document.getElementById('fleet-card').style.display = 'block';
+    syncList(document.getElementById('fleet-hosts'), data.hosts, host => host.host, buildHost, updateHost);
+    return true;
+}
+
+fetchFleet().then(isCollector => {
+    if (isCollector) {
+        setInterval(fetchFleet, 5000);
+    }
+}).catch(() => {});
+
+// Seconds of per-core / per-sensor history shown, refreshed every HEATMAP_REFRESH ms
+const HEATMAP_WINDOW = 3600;
+const HEATMAP_REFRESH = 10000;
+const heatmap = new Heatmap(document.getElementById('heatmap-chart'), HEATMAP_WINDOW);
+const heatmapKind = document.getElementById('heatmap-kind');
+const heatmapField = document.getElementById('heatmap-field');
+
+function drawHeatmap() {
+    const tiles = heatmap.tiles;
+    const field = heatmapField.value;
+    const range = tiles && tiles.rows ? Heatmap.range(tiles[field]) : null;
+    if (!range) {
+        heatmap.draw(field, 0, 0);
+        setTextById('heatmap-legend', 'No data yet');
+        return;
+    }
+    // CPU keeps a fixed 0-100% scale so colours compare across refreshes
+    const [low, high] = heatmapKind.value === 'cpu' ? [0, 100] : range;
+    heatmap.draw(field, low, high);
+    const unit = heatmapKind.value === 'cpu' ? '%' : '°C';
+    const labels = tiles.labels;
+    setTextById('heatmap-legend', `${labels[0]} (top) … ${labels[labels.length - 1]} (bottom), ` +
+        `${tiles.step}s per column, ${low.toFixed(0)}–${high.toFixed(0)}${unit}`);
+}
+
+async function fetchHeatmap() {
+    if (document.hidden) {
+        return;
+    }
+    const response = await fetch(`/api/heatmap?kind=${heatmapKind.value}&format=binary`);
+    if (response.status === 404) {
+        // Worker processes (--workers) keep no heatmap history; drop the card
+        document.getElementById('heatmap-card').style.display = 'none';
+        clearInterval(heatmapTimer);
+        return;
+    }
+    if (response.ok) {
+        heatmap.tiles = Heatmap.parse(await response.arrayBuffer());
+        drawHeatmap();
+    }
+}
+
+heatmapKind.addEventListener('change', () => fetchHeatmap().catch(() => {}));
+heatmapField.addEventListener('change', drawHeatmap);
+document.addEventListener('visibilitychange', () => fetchHeatmap().catch(() => {}));
+window.addEventListener('resize', drawHeatmap);
+fetchHeatmap().catch(() => {});
+const heatmapTimer = setInterval(() => fetchHeatmap().catch(() => {}), HEATMAP_REFRESH);
+
+document.addEventListener('visibilitychange', scheduleRender);
+window.addEventListener('resize', scheduleRender);
+
+async function fetchStats() {
+    if (document.hidden) {
+        return;
+    }
+    try {
+        const response = await fetch('/api/v2/stats');
+        receive(await response.json());
+    } catch (error) {
+        console.error('Error fetching stats:', error);
+    }
+}
+
+// Apply a JSON merge patch (RFC 7386) sent by /api/stream
+function applyPatch(target, patch) {
+    for (const [key, value] of Object.entries(patch)) {
+        if (value === null) {
+            delete target[key];
+        } else if (typeof value === 'object' && !Array.isArray(value) &&
+                   typeof target[key] === 'object' && target[key] !== null && !Array.isArray(target[key])) {
+            applyPatch(target[key], value);
+        } else {
+            target[key] = value;
+        }
+    }
+    return target;
+}
+
+function connectStream() {
+    let state = null;
+    const source = new EventSource('/api/stream');
+    source.addEventListener('full', event => {
+        state = JSON.parse(event.data);
+        receive(state);
+    });
+    source.addEventListener('delta', event => {
+        if (state) {
+            receive(applyPatch(state, JSON.parse(event.data)));
+        }
+    });
+    // EventSource gives up (CLOSED) on a non-200 answer, e.g. the 503 sent
+    // when the server has no threads to spare for another stream
+    source.addEventListener('error', () => {
+        if (source.readyState === EventSource.CLOSED) {
+            startPolling();
+        }
+    });
+}
+
+function startPolling() {
+    fetchStats();
+    setInterval(fetchStats, 2000);
+}
+
+if (window.EventSource) {
+    connectStream();
+} else {
+    startPolling();
+}
+
+fetch('/api/system')
+    .then(response => response.json())
+    .then(data => {
+        document.getElementById('cpu-cores').textContent = `${data.cpu_cores}/${data.cpu_threads}`;
+    });